@@ -1,5 +1,10 @@
+import functools
+import hashlib
 import importlib
 import sys
+import threading
+import time
+import zlib
 from collections import defaultdict
 from functools import cached_property
 from pathlib import Path
@@ -7,15 +12,59 @@ from pathlib import Path
 import sublime  # type: ignore
 import sublime_plugin  # type: ignore
 
+# a reload of the plugin finds lib already imported, and has to reload it
+# to pick up changes; the first import doesn't
+_reloading = f"{__name__}.lib" in sys.modules
+
 from . import lib
 from .vendor import mistune
 
-importlib.reload(lib)
+if _reloading:
+    importlib.reload(lib)
 
-_markdown = mistune.create_markdown(
-    renderer=mistune.AstRenderer(),
-    plugins=["footnotes", "table", "task_lists"],
-)
+# part of the key of the documents rendered to disk, so bump it along with
+# changes to the html the plugin renders
+__version__ = "1.1.0"
+
+PLUGINS = ["footnotes", "table", "task_lists"]
+
+
+class Parsers:
+    """
+    The markdown parsers, built (and their scanners compiled) once rather
+    than while Sublime imports the plugin: ``plugin_loaded`` starts the
+    build on the async thread, and asking for a parser before it's done
+    waits for it, or does it there and then.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._parsers = None
+
+    def build(self):
+        with self._lock:
+            if self._parsers is None:
+                ast_markdown = mistune.create_markdown(
+                    renderer=mistune.AstRenderer(),
+                    plugins=PLUGINS,
+                )
+                markdown = mistune.create_markdown(
+                    renderer=lib.MinihtmlRenderer(),
+                    plugins=[*PLUGINS, lib.defer_tables(ast_markdown)],
+                )
+                self._parsers = (ast_markdown.warm_up(), markdown.warm_up())
+            return self._parsers
+
+    @property
+    def ast(self):
+        return self.build()[0]
+
+    @property
+    def markdown(self):
+        return self.build()[1]
+
+
+parsers = Parsers()
 
 
 class Settings:
@@ -30,6 +79,16 @@ class Settings:
 settings = Settings()
 
 
+def plugin_loaded():
+    sublime.set_timeout_async(parsers.build)
+
+
+def plugin_unloaded():
+    # stop the timer and render threads, a reload starts fresh ones
+    lib.set_timeout.shutdown()
+    render_worker.shutdown()
+
+
 TEMPLATE = """
     <style type="text/css">
         .blockquote p {{
@@ -74,92 +133,685 @@ TEMPLATE = """
             border-bottom: 1px solid black;
             width: 100px;
         }}
+
+        .placeholder {{
+            color: gray;
+            font-style: italic;
+        }}
     </style>
     {content}
 """
 
+# stands in for the blocks a virtualized preview leaves out
+PLACEHOLDER = '<div class="placeholder">{lines} lines not shown</div>'
+
+
+def block_limits():
+    """The size and time a block may take to render before it's shown as text."""
+    return {
+        "max_block_size": settings.get("markdown-preview.max_block_size", 50000),
+        "max_block_time": settings.get("markdown-preview.max_block_time", 0.5),
+    }
+
+
+def first_blocks(source):
+    """
+    The html of the first few blocks of ``source``, for a new preview to
+    show while the whole document renders. This runs on the UI thread, so
+    the blocks are held to the usual limits, which also bound the time
+    spent on them all. Link and footnote definitions further down are left
+    for the full render to pick up.
+    """
+    count = settings.get("markdown-preview.first_blocks", 50)
+    if not count:
+        return ""
+    # a document of its own, as the view's may be rendering on the worker
+    document = lib.IncrementalDocument(parsers.markdown, **block_limits())
+    return document.first_blocks(source, count)
+
 
-def markdown(source):
-    ast = _markdown(source)
-    transformer = lib.Ast2HTML()
+class PreviewManager:
+    """
+    The open previews, any number of them: each previewed view with its
+    sheet. A preview stays open while its view is in the background, and
+    goes along with the view or the sheet, whichever is closed first.
 
-    return "\n".join(transformer.transform(**child) for child in ast)
+    Renders are shared by every preview of a buffer (a file open in
+    several views, through "New View into File"), so whatever only
+    depends on the text is kept per buffer, and dropped once the last
+    preview of the buffer closes.
+    """
 
+    FOCUSED, VISIBLE, HIDDEN = range(3)
 
-class SheetProxy:
     def __init__(self):
+        # view id: (view, sheet)
         self._map = {}
 
     def associate(self, view, sheet):
-        self._map[view] = sheet
+        self._map[view.id()] = (view, sheet)
+
+    def get(self, view):
+        return self._map.get(view.id(), (None, None))[1]
+
+    def views(self, buffer_id):
+        """The previewed views of a buffer."""
+        # copied first, as the render threads ask too
+        views = [view for view, _ in list(self._map.values())]
+        return [view for view in views if view.buffer_id() == buffer_id]
+
+    def close(self, view):
+        """Close the view's preview, if it has one, and drop its state."""
+        _, sheet = self._map.pop(view.id(), (None, None))
+        if sheet is not None:
+            sheet.close()
+        change_tracker.forget(view)
+        viewports.forget(view)
+        buffer_id = view.buffer_id()
+        if not self.views(buffer_id):
+            document_proxy.discard(buffer_id)
+            render_worker.forget(buffer_id)
+            change_tracker.invalidate(buffer_id)
+            debouncers.forget(buffer_id)
+
+    def priority(self, key):
+        """
+        Rank the buffer with id ``key`` for the render worker by its best
+        placed preview: a focused view first, then views showing in some
+        group, then hidden ones.
+        """
+        return min(map(self.view_priority, self.views(key)), default=self.HIDDEN)
+
+    def view_priority(self, view):
+        window = view.window()
+        if window is None:
+            return self.HIDDEN
+        group, _ = window.get_view_index(view)
+        if group < 0 or window.active_view_in_group(group) != view:
+            return self.HIDDEN
+        if window == sublime.active_window() and window.active_view() == view:
+            return self.FOCUSED
+        return self.VISIBLE
+
+    def __get__(self, instance, owner=None):
+        return self.get(instance.view)
+
+
+previews = PreviewManager()
 
-    def disassociate(self, view):
-        self._map.pop(view, None)
+
+class DocumentProxy:
+    """
+    Per-buffer incremental documents, so that an update only re-renders
+    the blocks touched since the previous one. Tables, which the preview
+    lays out through ``Ast2HTML``, are also remembered by structure in a
+    ``RenderCache`` per buffer, so a re-rendered block doesn't lay out
+    its unchanged tables again.
+    """
+
+    def __init__(self):
+        self._map = {}
+        self._transformers = {}
+
+    def discard(self, buffer_id):
+        self._map.pop(buffer_id, None)
+        self._transformers.pop(buffer_id, None)
+
+    def get(self, view):
+        return self._map.get(view.buffer_id())
+
+    def render_caches(self):
+        """Table render caches (with their hit/miss counters) by buffer id."""
+        return {key: t.cache for key, t in self._transformers.items()}
 
     def __get__(self, instance, owner=None):
-        return self._map.get(instance.view)
+        key = instance.view.buffer_id()
+        document = self._map.get(key)
+        if document is None:
+            cache = lib.RenderCache(
+                settings.get("markdown-preview.render_cache_size", 1024)
+            )
+            transformer = lib.Ast2HTML(cache=cache)
+            document = lib.IncrementalDocument(
+                parsers.markdown,
+                env={"ast2html": transformer},
+                **block_limits(),
+            )
+            self._map[key] = document
+            self._transformers[key] = transformer
+        return document
+
+
+document_proxy = DocumentProxy()
+
+
+def render_priority(key):
+    # previews render under their buffer's id, phantoms under
+    # ("phantoms", view id)
+    if isinstance(key, tuple):
+        return phantoms.priority(key[1])
+    return previews.priority(key)
+
+
+render_worker = lib.RenderWorker(
+    threads=lambda: settings.get("markdown-preview.render_threads", 2),
+    priority=render_priority,
+)
+# the html of whole (not virtualized) previews, by buffer, kept after the
+# preview closes so that reopening it on an unchanged buffer is instant
+html_cache = lib.HtmlCache(
+    budget=lambda: settings.get("markdown-preview.html_cache_size", 16 << 20)
+)
+
+
+def render_version():
+    """Everything besides the source that a document's blocks depend on."""
+    max_block_size = settings.get("markdown-preview.max_block_size", 50000)
+    return repr((__version__, mistune.__version__, PLUGINS, max_block_size))
+
+
+# the blocks of saved documents, kept across sessions so that opening the
+# preview of a file that hasn't changed since doesn't parse it again
+disk_cache = lib.DiskCache(
+    directory=lambda: Path(sublime.cache_path(), "MarkdownPreview"),
+    version=render_version,
+    max_size=lambda: settings.get("markdown-preview.disk_cache_size", 64 << 20),
+)
+
+
+def load_document(document, source):
+    """Load a document's blocks from the disk cache, if it has them."""
+    if not settings.get("markdown-preview.disk_cache_size", 64 << 20):
+        return False
+    data = disk_cache.get(source)
+    if data is None:
+        return False
+    try:
+        document.loads(source, data)
+    except (ValueError, TypeError, zlib.error):
+        disk_cache.discard(source)
+        return False
+    return True
+
+
+def save_document(document, source):
+    """Write an up to date document's blocks to the disk cache."""
+    if not settings.get("markdown-preview.disk_cache_size", 64 << 20):
+        return
+    # whether a block runs out of time depends on how busy the machine is,
+    # so its plain text fallback mustn't outlive the session
+    if document.timed_out:
+        return
+    if source not in disk_cache:
+        disk_cache.put(source, document.dumps())
+
+
+class ChangeTracker:
+    """
+    Remember what each buffer was last rendered from and what each preview
+    shows, so that selection changes (which fire the same event as edits)
+    and edits that cancel out don't cost a render.
+    """
+
+    def __init__(self):
+        self._change_counts = {}
+        self._digests = {}
+        self._contents = {}
+
+    def is_modified(self, view):
+        return view.change_count() != self._change_counts.get(view.buffer_id())
+
+    def snapshot(self, view, source):
+        """Record a snapshot, returning the digest of its text."""
+        self._change_counts[view.buffer_id()] = view.change_count()
+        return hashlib.blake2b(source.encode("utf-8", "surrogatepass")).digest()
+
+    def content_changed(self, view, digest):
+        """Whether a snapshot's text differs from the one last rendered."""
+        return digest != self._digests.get(view.buffer_id())
+
+    def rendered(self, buffer_id, digest):
+        """Record the text a render of the buffer went through with."""
+        self._digests[buffer_id] = digest
+
+    def contents_changed(self, view, contents):
+        """Record sheet contents, returning whether they differ from the last."""
+        if contents == self._contents.get(view.id()):
+            return False
+        self._contents[view.id()] = contents
+        return True
+
+    def invalidate(self, buffer_id):
+        """Forget the buffer's last snapshot, so the next one renders."""
+        self._change_counts.pop(buffer_id, None)
+        self._digests.pop(buffer_id, None)
 
+    def forget(self, view):
+        self._contents.pop(view.id(), None)
 
-sheet_proxy = SheetProxy()
+
+change_tracker = ChangeTracker()
+
+
+class Viewports:
+    """
+    Decide which source lines a virtualized preview shows: for documents
+    past the ``virtualize`` size, the view's visible lines plus a margin
+    either side.
+    """
+
+    def __init__(self):
+        self._windows = {}
+
+    def window(self, view):
+        """The lines to render now, as ``(first, last)``, or None for all."""
+        threshold = settings.get("markdown-preview.virtualize", 500000)
+        if not threshold or view.size() < threshold:
+            self._windows.pop(view.id(), None)
+            return None
+        margin = settings.get("markdown-preview.virtualize_margin", 200)
+        first, last = self._visible_lines(view)
+        window = (max(first - margin, 0), last + margin)
+        self._windows[view.id()] = window
+        return window
+
+    def scrolled(self, view):
+        """
+        Whether the visible lines came within half a margin of the edge
+        of the window rendered last.
+        """
+        window = self._windows.get(view.id())
+        if window is None:
+            return False
+        slack = settings.get("markdown-preview.virtualize_margin", 200) // 2
+        first, last = self._visible_lines(view)
+        return (window[0] > 0 and first - slack < window[0]) or last + slack > window[1]
+
+    def forget(self, view):
+        self._windows.pop(view.id(), None)
+
+    @staticmethod
+    def _visible_lines(view):
+        region = view.visible_region()
+        return view.rowcol(region.begin())[0], view.rowcol(region.end())[0]
+
+
+viewports = Viewports()
+
+
+class Debouncers:
+    """
+    The debounce of each previewed buffer's updates. Each learns from the
+    buffer's render times how long to wait after an edit, within the
+    ``debounce_min`` and ``debounce_max`` settings, and holds updates
+    back while the buffer still has a render under way.
+    """
+
+    def __init__(self):
+        self._map = {}
+
+    def get(self, view):
+        key = view.buffer_id()
+        debounced = self._map.get(key)
+        if debounced is None:
+            debounced = lib.debounce(
+                lambda: settings.get("markdown-preview.debounce", 0.1),
+                bounds=lambda: (
+                    settings.get("markdown-preview.debounce_min", 0),
+                    settings.get("markdown-preview.debounce_max", 1.0),
+                ),
+                busy=functools.partial(render_worker.is_busy, key),
+            )
+            self._map[key] = debounced
+        return debounced
+
+    def record(self, view, seconds):
+        """Note how long a render of the view took, from snapshot to sheet."""
+        self.get(view).record(seconds)
+
+    def forget(self, buffer_id):
+        self._map.pop(buffer_id, None)
+
+
+debouncers = Debouncers()
+
+
+def preview_html(view, document):
+    """The html to show for an up to date document, whole or virtualized."""
+    window = viewports.window(view)
+    if window is None:
+        return document.html
+    return document.window(*window, lambda lines: PLACEHOLDER.format(lines=lines))
+
+
+def previews_html(buffer_id, document):
+    """The html for each preview of a buffer, as ``(view, html)`` pairs."""
+    return [(view, preview_html(view, document)) for view in previews.views(buffer_id)]
+
+
+def show_previews(buffer_id, generation, htmls, started=None, digest=None):
+    if not render_worker.is_current(buffer_id, generation):
+        return
+    if digest is not None:
+        change_tracker.rendered(buffer_id, digest)
+    for view, html in htmls:
+        sheet = previews.get(view)
+        if sheet is None:
+            continue
+        contents = TEMPLATE.format(content=html)
+        if change_tracker.contents_changed(view, contents):
+            sheet.set_contents(contents)
+    if started is not None and htmls:
+        # the debounce is the buffer's, any of its views will do
+        debouncers.record(htmls[0][0], time.perf_counter() - started)
+
+
+def render_preview(view, document):
+    """
+    Render a snapshot of the view's buffer on the render worker, then show
+    it in the preview sheets of the buffer's views unless a newer snapshot
+    came in meanwhile. A newer snapshot also cancels the render if it's
+    already under way.
+
+    The text is only recorded as rendered once the render went through,
+    so a render that failed is tried again on the next change. A text
+    the same as the one last rendered still renders while another is
+    on its way, which would otherwise be shown.
+    """
+    if not change_tracker.is_modified(view):
+        return
+    buffer_id = view.buffer_id()
+    generation = view.change_count()
+    source = view.substr(sublime.Region(0, view.size()))
+    digest = change_tracker.snapshot(view, source)
+    busy = render_worker.is_busy(buffer_id)
+    if not busy and not change_tracker.content_changed(view, digest):
+        return
+    started = time.perf_counter()
+    # the file as saved, which is what the next session will open
+    saved = not view.is_dirty()
+
+    def render(cancel):
+        if not document.rendered:
+            load_document(document, source)
+        document.update(source, cancel)
+        if saved:
+            save_document(document, source)
+        htmls = previews_html(buffer_id, document)
+        if any(html is document.html for _, html in htmls):
+            html_cache.put(buffer_id, generation, document.html)
+        return htmls
+
+    render_worker.submit(
+        buffer_id,
+        generation,
+        render,
+        lambda htmls: sublime.set_timeout(
+            functools.partial(
+                show_previews, buffer_id, generation, htmls, started, digest
+            )
+        ),
+    )
+
+
+# ids of the views watch_preview is polling
+watched_views = set()
+
+
+def watch_preview(view):
+    """
+    Poll a previewed view's scroll position and its preview sheet (there
+    are no events for either), moving the window of a virtualized preview
+    along with the view, and closing the preview once the sheet is closed.
+    A view already polled keeps its poll, which picks up a new sheet.
+    """
+    if view.id() in watched_views:
+        return
+    watched_views.add(view.id())
+    _poll_preview(view)
+
+
+def _poll_preview(view):
+    sheet = previews.get(view)
+    document = document_proxy.get(view)
+    if sheet is None or document is None:
+        watched_views.discard(view.id())
+        return
+    if sheet.window() is None:
+        watched_views.discard(view.id())
+        previews.close(view)
+        return
+    if viewports.scrolled(view):
+        buffer_id = view.buffer_id()
+        generation = view.change_count()
+        # a render already on its way picks up the new position by itself
+        render_worker.submit(
+            buffer_id,
+            generation,
+            lambda cancel: previews_html(buffer_id, document),
+            lambda htmls: sublime.set_timeout(
+                functools.partial(show_previews, buffer_id, generation, htmls)
+            ),
+            replace=False,
+        )
+    sublime.set_timeout(
+        functools.partial(_poll_preview, view),
+        settings.get("markdown-preview.viewport_poll", 250),
+    )
+
+
+class PhantomPreviews:
+    """
+    Views showing their heavy blocks (see ``phantom_blocks``) rendered as
+    phantoms under the blocks' source, instead of in a preview sheet.
+
+    The blocks are found on the render worker, and the phantoms matched
+    against them by block hash and line: those still in place are left
+    alone, so an edit only replaces the phantoms of the blocks it changed.
+    """
+
+    KEY = "markdown-preview"
+
+    def __init__(self):
+        # view id: (view, PhantomBlocks, {phantom id: block hash})
+        self._map = {}
+        self._debounces = {}
+        # view id: change count last rendered
+        self._generations = {}
+
+    def get(self, view):
+        entry = self._map.get(view.id())
+        return entry and entry[1]
+
+    def open(self, view):
+        blocks = lib.PhantomBlocks(
+            parsers.ast,
+            # PhantomBlocks keeps the html of each block itself
+            lib.Ast2HTML(),
+            settings.get(
+                "markdown-preview.phantom_blocks", ["table", "image", "task_list_item"]
+            ),
+        )
+        self._map[view.id()] = (view, blocks, {})
+        self._debounces[view.id()] = lib.debounce(
+            lambda: settings.get("markdown-preview.debounce", 0.1),
+            busy=functools.partial(render_worker.is_busy, self._key(view)),
+        )(functools.partial(self.render, view))
+        self.render(view)
+
+    def close(self, view):
+        entry = self._map.pop(view.id(), None)
+        self._debounces.pop(view.id(), None)
+        self._generations.pop(view.id(), None)
+        render_worker.forget(self._key(view))
+        if entry is not None:
+            for phantom_id in entry[2]:
+                view.erase_phantom_by_id(phantom_id)
+
+    def update(self, view):
+        debounced = self._debounces.get(view.id())
+        if debounced is None or view.change_count() == self._generations[view.id()]:
+            return
+        if settings.get("markdown-preview.debounce", None):
+            debounced()
+        else:
+            self.render(view)
+
+    def render(self, view):
+        blocks = self.get(view)
+        if blocks is None:
+            return
+        key = self._key(view)
+        generation = view.change_count()
+        self._generations[view.id()] = generation
+        source = view.substr(sublime.Region(0, view.size()))
+        render_worker.submit(
+            key,
+            generation,
+            lambda cancel: blocks.update(source, cancel),
+            lambda phantoms: sublime.set_timeout(
+                functools.partial(self.show, view, generation, phantoms)
+            ),
+        )
+
+    def show(self, view, generation, phantoms):
+        entry = self._map.get(view.id())
+        if entry is None or not render_worker.is_current(self._key(view), generation):
+            return
+        _, _, shown = entry
+        ids = list(shown)
+        # where the phantoms shown are now, having moved along with edits
+        kept = {
+            (shown[phantom_id], view.rowcol(region.a)[0]): phantom_id
+            for phantom_id, region in zip(ids, view.query_phantoms(ids))
+        }
+        now = {}
+        for digest, line, html in phantoms:
+            phantom_id = kept.pop((digest, line), None)
+            if phantom_id is None:
+                point = view.line(view.text_point(line, 0)).end()
+                phantom_id = view.add_phantom(
+                    self.KEY,
+                    sublime.Region(point),
+                    TEMPLATE.format(content=html),
+                    sublime.LAYOUT_BELOW,
+                )
+            now[phantom_id] = digest
+        for phantom_id in kept.values():
+            view.erase_phantom_by_id(phantom_id)
+        shown.clear()
+        shown.update(now)
+
+    def priority(self, view_id):
+        entry = self._map.get(view_id)
+        if entry is None:
+            return previews.HIDDEN
+        return previews.view_priority(entry[0])
+
+    @staticmethod
+    def _key(view):
+        return ("phantoms", view.id())
+
+
+phantoms = PhantomPreviews()
 
 
 class MarkdownPreviewCommand(sublime_plugin.TextCommand):
-    sheet = sheet_proxy
+    sheet = previews
+    document = document_proxy
 
     def run(self, edit):
         view = self.view
         if "markdown" not in view.syntax().scope:
             return
 
-        if self.sheet:
-            return
-        content = markdown(self.view.substr(sublime.Region(0, self.view.size())))
-        sheet = view.window().new_html_sheet(
-            f"Preview",
-            TEMPLATE.format(content=content),
+        sheet = self.sheet
+        if sheet is not None:
+            if sheet.window() is not None:
+                return
+            # closed since the last poll, which hasn't noticed yet
+            previews.close(view)
+        source = view.substr(sublime.Region(0, view.size()))
+        html = html_cache.get(view.buffer_id(), view.change_count())
+        contents = TEMPLATE.format(
+            content=first_blocks(source) if html is None else html
         )
+        sheet = view.window().new_html_sheet(f"Preview", contents)
         view.window().select_sheets([view.sheet(), sheet])
         view.window().focus_view(view)
-        sheet_proxy.associate(view, sheet)
+        previews.associate(view, sheet)
+        if html is not None:
+            # already up to date, the document is left to render on the
+            # first edit
+            digest = change_tracker.snapshot(view, source)
+            change_tracker.rendered(view.buffer_id(), digest)
+            change_tracker.contents_changed(view, contents)
+        else:
+            # the buffer may be up to date for the previews of other views,
+            # rendering it again then only costs a look at the text
+            change_tracker.invalidate(view.buffer_id())
+        render_preview(view, self.document)
+        watch_preview(view)
 
     def is_enabled(self):
         return "markdown" in self.view.syntax().scope
 
 
-class MarkdownViewUpdate(sublime_plugin.ViewEventListener):
-    sheet = sheet_proxy
+class MarkdownPreviewPhantomsCommand(sublime_plugin.TextCommand):
+    """Toggle showing heavy blocks rendered as phantoms under their source."""
 
-    def on_deactivated(self):
-        if self.sheet:
-            self.sheet.close()
-        sheet_proxy.disassociate(self.view)
+    def run(self, edit):
+        view = self.view
+        if phantoms.get(view) is not None:
+            phantoms.close(view)
+        elif "markdown" in view.syntax().scope:
+            phantoms.open(view)
+
+    def is_enabled(self):
+        return "markdown" in self.view.syntax().scope
+
+
+class MarkdownViewUpdate(sublime_plugin.ViewEventListener):
+    document = document_proxy
 
     # For some reason this isn't firing
     # def on_text_changed(self, changes):
     #     pass
 
+    @property
+    def previewed(self):
+        # a clone of the view may have the preview, which edits here update
+        return bool(previews.views(self.view.buffer_id()))
+
     def update(self):
-        if self.sheet is None:
+        if not self.previewed:
             return
-        self.sheet.set_contents(
-            TEMPLATE.format(
-                content=markdown(self.view.substr(sublime.Region(0, self.view.size())))
-            )
-        )
+        render_preview(self.view, self.document)
 
-    @cached_property
     def debounced_update(self):
-        # debouncing updates so the preview isn't fired on every keystroke
-        return lib.debounce(lambda: settings.get("markdown-preview.debounce", 0.1))(
-            self.update
-        )
+        # debouncing updates so the preview isn't fired on every keystroke;
+        # looked up each time, as the buffer's debounce goes along with its
+        # last preview
+        debouncers.get(self.view)(self.update)()
+
+    def on_pre_close(self):
+        # the view's buffer is still there to look up
+        previews.close(self.view)
+        phantoms.close(self.view)
+
+    def on_post_save(self):
+        # saving doesn't change the text, but renders it to disk
+        if self.previewed:
+            change_tracker.invalidate(self.view.buffer_id())
+            render_preview(self.view, self.document)
 
     # Not really happy with having to use the on_selection_modified event
     # since it also means we update on selection changes and not just
     # buffer changes, but on_text_changed isn't firing for me
     def on_selection_modified(self):
-        sheet = self.sheet
-        if sheet is None:
+        if phantoms.get(self.view) is not None:
+            phantoms.update(self.view)
+        if not self.previewed or not change_tracker.is_modified(self.view):
             return
 
         if settings.get("markdown-preview.debounce", None):
@@ -0,0 +1,5 @@
+# Headless benchmarks, run from the repository root:
+#
+#     python -m benchmarks.pipeline run -o before.json
+#     python -m benchmarks.pipeline compare before.json after.json
+#     python -m benchmarks.debounce
@@ -0,0 +1,139 @@
+"""
+Time inline parsing on inputs that make the emphasis and link regexes
+backtrack, and on ordinary text, with the default scanner (which indexes
+delimiters and brackets where the text is pathological for a rule, see
+``mistune.delimiters``) and with the plain regex scanner, and check that
+the indexes parse a regression corpus the same as the regex.
+
+    python -m benchmarks.backtracking [--units 500,2000] [--fuzz 20000]
+"""
+import argparse
+import random
+import sys
+import time
+
+from . import corpus
+from .plugin import mistune
+
+PLUGINS = ["strikethrough", "footnotes", "table", "task_lists"]
+
+#: runs of delimiters that never close, repeated ``units`` times
+PATHOLOGICAL = {
+    "underscore": "_a ",
+    "strong_underscore": "__a ",
+    "asterisk": "*a ",
+    "strong_asterisk": "**a ",
+    "tilde": "~~a ",
+    "nested": "_a *b* ",
+    "mixed": "_a_b *c* __d__ ",
+    "escaped": "*a \\* ",
+    "link_destination": "[a](",
+    "link_paren": "[a](b(",
+    "link_angle": "[a](<",
+    "image": "![a](b ",
+    "ref_link": "[a][",
+    "footnote": "[^a ",
+}
+
+#: ordinary text, which should parse no slower than with the regex
+NORMAL = {
+    "prose": "Some plain words, with a snake_case name and a 2*3 sum. ",
+    "prose_emphasis": "Some *emphasis*, **strong** and _under_ __scored__ ~~text~~. ",
+    "dense_markup": "*a* _b_ `c` ",
+    "checklist": "[x] ",
+    "unresolved_refs": "[a][b] ",
+    "prose_links": (
+        'See [the docs](https://example.com/docs "Docs"), ![a figure](/a.png), '
+        "[a reference][a] and a note[^a]. "
+    ),
+}
+
+FUZZ_ALPHABET = list("*_~\\ a.!b,`[]()<>^\"\n") + [
+    "**", "__", "~~", "\\*", "\\_", "](", "[^a]", "\\(", "\\)",
+]
+
+
+class RegexInlineParser(mistune.InlineParser):
+    """The inline parser with every rule matched by the combined regex."""
+
+    scanner_cls = mistune.scanner.Scanner
+
+
+class IndexingScanner(mistune.delimiters.DelimiterScanner):
+    """Leaves every indexed rule to its index, whatever the text."""
+
+    SHORT_TEXT = 0
+
+    def pathological(self, string):
+        return tuple(entry for entry in self.indexed if entry[1].CHAR in string)
+
+
+class IndexedInlineParser(mistune.InlineParser):
+    """The inline parser with every indexed rule matched by its index."""
+
+    scanner_cls = IndexingScanner
+
+
+def create(parser_cls=None):
+    md = mistune.create_markdown(renderer=mistune.AstRenderer(), plugins=PLUGINS)
+    if parser_cls is not None:
+        # swap the class before any scanner is built and cached
+        md.inline.__class__ = parser_cls
+        md.inline._cached_sc.clear()
+    return md
+
+
+def timings(mds, source, repeat):
+    """The best time of each of ``mds``, run in turn so that they see the
+    same changes in machine load."""
+    best = [float("inf")] * len(mds)
+    for _ in range(repeat):
+        for i, md in enumerate(mds):
+            start = time.perf_counter()
+            md(source)
+            best[i] = min(best[i], time.perf_counter() - start)
+    return best
+
+
+def regressions(fuzz, seed):
+    indexed, regex = create(IndexedInlineParser), create(RegexInlineParser)
+    texts = [corpus.generate(20_000, seed=seed)]
+    definitions = "[a]: /a\n[^a]: note\n\n"
+    rng = random.Random(seed)
+    for _ in range(fuzz):
+        length = rng.randint(1, 60)
+        texts.append(definitions + "".join(
+            rng.choice(FUZZ_ALPHABET) for _ in range(length)
+        ))
+    texts.extend(unit * 50 for unit in PATHOLOGICAL.values())
+    return [text for text in texts if indexed(text) != regex(text)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--units", default="500,2000")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--fuzz", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    default, regex = create(), create(RegexInlineParser)
+    print(f"{'input':<18} {'units':>6} {'regex ms':>10} {'default ms':>10} {'speedup':>8}")
+    for name, unit in {**PATHOLOGICAL, **NORMAL}.items():
+        for units in map(int, args.units.split(",")):
+            source = unit * units
+            before, after = timings([regex, default], source, args.repeat)
+            print(
+                f"{name:<18} {units:>6} {before * 1000:>10.1f} {after * 1000:>10.1f}"
+                f" {before / after:>7.1f}x"
+            )
+
+    mismatches = regressions(args.fuzz, args.seed)
+    print(f"\n{len(mismatches)} mismatch(es) over {args.fuzz} fuzzed inputs and the corpus")
+    for text in mismatches[:10]:
+        print(f"  {text!r}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
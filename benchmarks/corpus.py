@@ -0,0 +1,118 @@
+"""
+Deterministic markdown corpus generator.
+
+The mix is weighted towards the constructs that are expensive to parse and
+render: tables, nested lists, footnotes, task lists and code fences.
+"""
+import random
+
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod "
+    "tempor incididunt ut labore et dolore magna aliqua preview render sheet "
+    "block inline parser table column footnote"
+).split()
+
+
+def _words(rng, n):
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+def _inline(rng, n):
+    words = _words(rng, n).split()
+    for i in range(0, len(words), 5):
+        kind = rng.randrange(6)
+        if kind == 0:
+            words[i] = f"*{words[i]}*"
+        elif kind == 1:
+            words[i] = f"**{words[i]}**"
+        elif kind == 2:
+            words[i] = f"[{words[i]}](https://example.com/{words[i]})"
+        elif kind == 3:
+            words[i] = f"`{words[i]}`"
+    return " ".join(words)
+
+
+def paragraph(rng, state):
+    return f"{_inline(rng, rng.randint(20, 60))}\n"
+
+
+def heading(rng, state):
+    return f"{'#' * rng.randint(1, 4)} {_words(rng, rng.randint(2, 6))}\n"
+
+
+def table(rng, state):
+    columns = rng.randint(2, 6)
+    aligns = [rng.choice(["---", ":--", ":-:", "--:"]) for _ in range(columns)]
+    lines = [
+        "| " + " | ".join(_words(rng, 1) for _ in range(columns)) + " |",
+        "| " + " | ".join(aligns) + " |",
+    ]
+    for _ in range(rng.randint(3, 20)):
+        # no code spans: they have no width in the ascii table layout
+        cells = (
+            rng.choice([_words(rng, rng.randint(1, 4)), f"*{_words(rng, 1)}*"])
+            for _ in range(columns)
+        )
+        lines.append("| " + " | ".join(cells) + " |")
+    return "\n".join(lines) + "\n"
+
+
+def nested_list(rng, state, depth=0):
+    lines = []
+    for _ in range(rng.randint(2, 5)):
+        marker = rng.choice(["*", "-", "1."])
+        lines.append(f"{'    ' * depth}{marker} {_inline(rng, rng.randint(3, 12))}")
+        if depth < 3 and rng.random() < 0.4:
+            lines.append(nested_list(rng, state, depth + 1).rstrip("\n"))
+    return "\n".join(lines) + "\n"
+
+
+def task_list(rng, state):
+    return "".join(
+        f"- [{rng.choice(' x')}] {_inline(rng, rng.randint(3, 10))}\n"
+        for _ in range(rng.randint(3, 8))
+    )
+
+
+def code_fence(rng, state):
+    body = "\n".join(
+        f"    {_words(rng, 2).replace(' ', '_')} = {rng.randint(0, 999)}  # <{i}>"
+        for i in range(rng.randint(3, 25))
+    )
+    return f"```{rng.choice(['python', 'js', ''])}\n{body}\n```\n"
+
+
+def footnote(rng, state):
+    state["footnotes"] += 1
+    key = f"note{state['footnotes']}"
+    return (
+        f"{_inline(rng, rng.randint(10, 30))}[^{key}] {_words(rng, 5)}.\n\n"
+        f"[^{key}]: {_inline(rng, rng.randint(5, 20))}\n"
+    )
+
+
+WEIGHTS = (
+    (table, 20),
+    (nested_list, 18),
+    (task_list, 14),
+    (code_fence, 14),
+    (footnote, 12),
+    (paragraph, 14),
+    (heading, 8),
+)
+
+
+def generate(size, seed=0):
+    """Return a markdown document of about ``size`` characters."""
+    rng = random.Random(seed)
+    state = {"footnotes": 0}
+    generators = [generator for generator, _ in WEIGHTS]
+    weights = [weight for _, weight in WEIGHTS]
+    blocks = []
+    length = 0
+    while length < size:
+        (generator,) = rng.choices(generators, weights)
+        block = generator(rng, state)
+        blocks.append(block)
+        length += len(block) + 1
+    return "\n".join(blocks)
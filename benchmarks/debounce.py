@@ -0,0 +1,100 @@
+"""
+Stress the debounce timer: fire schedule/cancel pairs the way a fast
+typist does, then measure how late callbacks run.
+
+    python -m benchmarks.debounce [--pairs 10000] [--samples 500]
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+
+from .plugin import plugin
+
+_debounce = plugin.lib._debounce
+
+
+def stress(pairs):
+    set_timeout = _debounce.SetTimeoutFactory()
+    debounced = _debounce.debounce(0.05)
+    fired = []
+    peak_threads = threading.active_count()
+
+    # route the debounce decorator through a private factory
+    _debounce.set_timeout, saved = set_timeout, _debounce.set_timeout
+    try:
+        call = debounced(lambda: fired.append(time.monotonic()))
+        cpu = time.process_time()
+        wall = time.perf_counter()
+        for i in range(pairs):
+            id = set_timeout(fired.append, 0.05)
+            set_timeout.cancel(id)
+            call()
+            if i % 100 == 0:
+                peak_threads = max(peak_threads, threading.active_count())
+        cpu = time.process_time() - cpu
+        wall = time.perf_counter() - wall
+        time.sleep(0.2)
+    finally:
+        _debounce.set_timeout = saved
+        set_timeout.shutdown()
+
+    return {
+        "pairs": pairs,
+        "peak_threads": peak_threads,
+        "cpu_seconds": cpu,
+        "wall_seconds": wall,
+        "debounced_calls": len(fired),
+    }
+
+
+def latency(samples, spacing=0.002):
+    set_timeout = _debounce.SetTimeoutFactory()
+    lateness = []
+    done = threading.Event()
+
+    def callback(deadline):
+        lateness.append(time.monotonic() - deadline)
+        if len(lateness) == samples:
+            done.set()
+
+    start = time.monotonic()
+    for i in range(samples):
+        timeout = 0.05 + i * spacing
+        set_timeout(lambda d=start + timeout: callback(d), timeout)
+    done.wait(0.05 + samples * spacing + 5)
+    set_timeout.shutdown()
+
+    ms = sorted(x * 1000 for x in lateness)
+    return {
+        "samples": len(ms),
+        "mean_ms": statistics.mean(ms),
+        "p50_ms": ms[len(ms) // 2],
+        "p99_ms": ms[min(len(ms) - 1, len(ms) * 99 // 100)],
+        "max_ms": ms[-1],
+        "jitter_ms": statistics.pstdev(ms),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pairs", type=int, default=10000)
+    parser.add_argument("--samples", type=int, default=500)
+    parser.add_argument("--json", action="store_true", help="print JSON")
+    args = parser.parse_args(argv)
+
+    results = {"stress": stress(args.pairs), "latency": latency(args.samples)}
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for section, values in results.items():
+        print(section)
+        for key, value in values.items():
+            if isinstance(value, float):
+                value = f"{value:.4f}"
+            print(f"  {key:<16} {value}")
+
+
+if __name__ == "__main__":
+    main()
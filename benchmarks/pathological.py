@@ -0,0 +1,143 @@
+"""
+Time the block and inline rules on inputs known (or suspected) to make
+their regexes backtrack, failing if any of them grows faster than about
+linearly or goes over its time budget, and check that the preview's
+per-block guard turns a block over its limits into plain text.
+
+Each input starts from the smaller unit count, doubled until the input
+takes ``--floor`` seconds to parse, and is then timed at that count and
+at as many times more as the unit counts are apart. Below the floor,
+timer noise and cache effects swamp the growth being measured.
+
+    python -m benchmarks.pathological [--units 1000,4000] [--budget 1.0]
+"""
+import argparse
+import statistics
+import sys
+import time
+
+from .plugin import mistune, plugin
+
+PLUGINS = [
+    "strikethrough", "footnotes", "table", "task_lists", "def_list", "abbr", "url",
+]
+
+#: (rule, unit repeated ``units`` times, text around the repeats)
+PATHOLOGICAL = {
+    "def_list_terms": ("def_list", "term\n", "{}: def\n"),
+    "def_list_items": ("def_list", "t\n: d\n", "{}z"),
+    "def_list_long": ("def_list", ": d\n", "term\n{}" + "x" * 50),
+    "block_html6": ("block_html", "x\n", "<div>\n{}"),
+    "block_html6_open": ("block_html", "<div\n", "{}"),
+    "block_html7": ("block_html", "x\n", '<a b="c">\n{}'),
+    "block_html7_attrs": ("block_html", " b", "<a{}>\n"),
+    "block_html7_tags": ("block_html", '<a b="c"', "{}\n"),
+    "underscore": ("emphasis", "_a ", "{}"),
+    "underscore_strong": ("emphasis", "__a ", "{}"),
+    "codespan": ("codespan", "`a ", "{}"),
+    "codespan_runs": ("codespan", "`a", "``{}"),
+    "codespan_escaped": ("codespan", "\\`", "{}`"),
+    "table_rows": ("table", "c|d\n", "a|b\n-|-\n{}"),
+    "table_pipes": ("table", "|", "{}\n"),
+    "table_header": ("table", "|a", "{}\n|b\n"),
+    "nptable_lines": ("table", "a|", "{0}\n{0}\n{0}\n"),
+    "heading_spaces": ("axt_heading", " ", "# a{}#x\n"),
+    "linebreak_spaces": ("linebreak", " ", "a{}b\n"),
+    "pasted_log": (
+        "paragraph",
+        "2024-01-01 12:00:00 [INFO] <main> *** _job_ `run` | [done](\n",
+        "{}",
+    ),
+}
+
+
+def create():
+    return mistune.create_markdown(renderer=mistune.AstRenderer(), plugins=PLUGINS)
+
+
+def timing(md, source, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        md(source)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def calibrate(md, template, unit, units, floor, repeat, limit=1 << 20):
+    """The unit count, from ``units`` doubling up to ``limit``, at which
+    the input takes at least ``floor`` seconds."""
+    while units < limit and timing(md, template.format(unit * units), repeat) < floor:
+        units *= 2
+    return units
+
+
+def guard(units):
+    """Whether an oversized block renders as plain text, and how long it took."""
+    md = plugin.parsers.markdown
+    source = PATHOLOGICAL["pasted_log"][1] * units
+    document = plugin.lib.IncrementalDocument(md, max_block_size=len(source) // 2)
+    start = time.perf_counter()
+    html = document.update(source)
+    elapsed = time.perf_counter() - start
+    return html == str(md.renderer.block_code(source)), elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--units", default="1000,4000")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--budget", type=float, default=1.0, help="seconds allowed per input"
+    )
+    parser.add_argument(
+        "--growth",
+        type=float,
+        default=2.0,
+        help="how many times faster than linear an input may grow",
+    )
+    parser.add_argument(
+        "--floor",
+        type=float,
+        default=0.02,
+        help="seconds the smaller count of units is raised to take at least",
+    )
+    args = parser.parse_args(argv)
+    small, large = map(int, args.units.split(","))
+    linear = large / small
+
+    md = create()
+    failures = []
+    print(
+        f"{'input':<18} {'rule':<12} {'units':>8} {'ms':>8}"
+        f" {'units':>8} {'ms':>8} {'growth':>7}"
+    )
+    for name, (rule, unit, template) in PATHOLOGICAL.items():
+        counts = [calibrate(md, template, unit, small, args.floor, args.repeat)]
+        counts.append(round(counts[0] * linear))
+        times = [
+            timing(md, template.format(unit * units), args.repeat)
+            for units in counts
+        ]
+        growth = times[1] / max(times[0], 1e-9)
+        over = times[1] > args.budget or growth > linear * args.growth
+        if over:
+            failures.append(name)
+        print(
+            f"{name:<18} {rule:<12} {counts[0]:>8} {times[0] * 1000:>8.1f}"
+            f" {counts[1]:>8} {times[1] * 1000:>8.1f}"
+            f" {growth:>6.1f}x{'  FAIL' if over else ''}"
+        )
+
+    plain, elapsed = guard(large)
+    outcome = "plain text" if plain else "NOT plain text"
+    print(f"\nblock guard: {outcome} in {elapsed * 1000:.1f} ms")
+    if not plain:
+        failures.append("block guard")
+
+    print(f"{len(failures)} failure(s)" + "".join(f"\n  {name}" for name in failures))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
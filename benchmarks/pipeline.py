@@ -0,0 +1,310 @@
+"""
+Time each stage of the parse -> AST -> minihtml pipeline over a generated
+corpus, and compare runs.
+
+    python -m benchmarks.pipeline run [--sizes 1K,10K,100K,1M,10M] [-o out.json]
+    python -m benchmarks.pipeline compare base.json new.json [--threshold 0.1]
+
+Stages:
+
+preprocess     ``Markdown.before_parse`` (``mistune.markdown.preprocess``)
+block_parse    ``BlockParser.parse`` plus the before-render hooks
+inline_parse   the inline pass of ``BlockParser.render`` (and the footnotes
+               hook), with a renderer that builds nothing
+ast_renderer   the same pass with ``AstRenderer``, minus ``inline_parse``
+ast2html       ``lib.Ast2HTML.transform`` over the resulting AST
+total          all of the above, the AST round-trip
+minihtml       the render pass with ``lib.MinihtmlRenderer`` instead, going
+               straight from the parser callbacks to minihtml
+direct_total   preprocess, block_parse and minihtml
+
+Each run also reports the memory held by the tokens and AST of a
+document, built as dicts and as compact nodes (``mistune.nodes``), and
+how long ``Markdown.warm_up`` takes to compile a fresh parser's scanners.
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+from . import corpus
+from .plugin import mistune, plugin
+
+PLUGINS = ["footnotes", "table", "task_lists"]
+SIZES = "1K,10K,100K,1M,10M"
+STAGES = (
+    "preprocess",
+    "block_parse",
+    "inline_parse",
+    "ast_renderer",
+    "ast2html",
+    "total",
+    "minihtml",
+    "direct_total",
+)
+UNITS = {"K": 1_000, "M": 1_000_000}
+
+
+class NullRenderer(mistune.renderers.BaseRenderer):
+    """Accept every render call and build nothing, to time parsing alone."""
+
+    NAME = "null"
+
+    def _get_method(self, name):
+        return self._null
+
+    @staticmethod
+    def _null(*args):
+        return ""
+
+    def finalize(self, data):
+        for _ in data:
+            pass
+        return ""
+
+
+def parse_size(label):
+    label = label.strip().upper()
+    if label[-1] in UNITS:
+        return int(float(label[:-1]) * UNITS[label[-1]])
+    return int(label)
+
+
+def measure(source, md, null_md):
+    timings = {}
+
+    start = time.perf_counter()
+    s, state = md.before_parse(source, {})
+    timings["preprocess"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tokens = md.block.parse(s, state)
+    tokens = md.before_render(tokens, state)
+    timings["block_parse"] = time.perf_counter() - start
+
+    null_state = dict(state, footnotes=[])
+    start = time.perf_counter()
+    result = null_md.block.render(tokens, null_md.inline, null_state)
+    null_md.after_render(result, null_state)
+    timings["inline_parse"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ast = md.block.render(tokens, md.inline, state)
+    ast = md.after_render(ast, state)
+    timings["ast_renderer"] = max(
+        time.perf_counter() - start - timings["inline_parse"], 0.0
+    )
+
+    start = time.perf_counter()
+    transformer = plugin.lib.Ast2HTML()
+    "\n".join(transformer.transform(**child) for child in ast)
+    timings["ast2html"] = time.perf_counter() - start
+
+    timings["total"] = sum(timings.values())
+
+    direct_md = plugin.parsers.markdown
+    direct_state = dict(state, footnotes=[])
+    start = time.perf_counter()
+    direct_tokens = direct_md.before_render(tokens, direct_state)
+    result = direct_md.block.render(direct_tokens, direct_md.inline, direct_state)
+    direct_md.after_render(result, direct_state)
+    timings["minihtml"] = time.perf_counter() - start
+    timings["direct_total"] = (
+        timings["preprocess"] + timings["block_parse"] + timings["minihtml"]
+    )
+    return timings
+
+
+def _build_ast(source, md):
+    s, state = md.before_parse(source, {})
+    tokens = md.block.parse(s, state)
+    tokens = md.before_render(tokens, state)
+    ast = md.block.render(tokens, md.inline, state)
+    return md.after_render(ast, state)
+
+
+def measure_memory(source, md):
+    """
+    Bytes allocated for, and still held by, the tokens and AST. The source
+    is parsed twice beforehand, so that what the parser sets up once for
+    good (compact node classes, compiled scanners) isn't counted as the
+    document's.
+    """
+    for _ in range(2):
+        _build_ast(source, md)
+    tracemalloc.start()
+    try:
+        ast = _build_ast(source, md)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del ast
+    return {"current": current, "peak": peak}
+
+
+def measure_warm_up():
+    """Seconds to compile every scanner of a fresh parser, and how many."""
+    md = mistune.create_markdown(renderer=mistune.AstRenderer(), plugins=PLUGINS)
+    start = time.perf_counter()
+    md.warm_up()
+    return {
+        "seconds": time.perf_counter() - start,
+        "scanners": len(md.block._cached_sc) + len(md.inline._cached_sc),
+    }
+
+
+def run(args):
+    md = mistune.create_markdown(renderer=mistune.AstRenderer(), plugins=PLUGINS)
+    compact_md = mistune.create_markdown(
+        renderer=mistune.AstRenderer(compact=True), plugins=PLUGINS, compact=True
+    )
+    null_md = mistune.create_markdown(renderer=NullRenderer(), plugins=PLUGINS)
+    warm_up = measure_warm_up()
+    print(
+        f"warm_up {warm_up['seconds'] * 1000:.2f}ms scanners={warm_up['scanners']}",
+        file=sys.stderr,
+    )
+
+    results = []
+    for label in args.sizes.split(","):
+        size = parse_size(label)
+        source = corpus.generate(size, seed=args.seed)
+        repeat = args.repeat if size < 1_000_000 else 1
+        samples = [measure(source, md, null_md) for _ in range(repeat)]
+        stages = {
+            stage: {
+                "min": min(sample[stage] for sample in samples),
+                "median": statistics.median(sample[stage] for sample in samples),
+            }
+            for stage in STAGES
+        }
+        memory = {
+            "dict": measure_memory(source, md),
+            "compact": measure_memory(source, compact_md),
+        }
+        results.append(
+            {
+                "label": label,
+                "bytes": len(source),
+                "repeat": repeat,
+                "stages": stages,
+                "memory": memory,
+            }
+        )
+        print(_format_row(label, stages), file=sys.stderr)
+        print(_format_memory(label, memory), file=sys.stderr)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "mistune": mistune.__version__,
+            "seed": args.seed,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "warm_up": warm_up,
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+def _format_row(label, stages):
+    cells = " ".join(f"{stage}={stages[stage]['median'] * 1000:.2f}ms" for stage in STAGES)
+    return f"{label:>5} {cells}"
+
+
+#: below this many bytes held by the dict AST, the difference between the
+#: two is mostly the interpreter's own overhead, and no saving is reported
+MEMORY_FLOOR = 64 * 1024
+
+
+def _format_memory(label, memory):
+    held = memory["dict"]["current"]
+    compact = memory["compact"]["current"]
+    if held >= MEMORY_FLOOR:
+        saving = f"{(held - compact) / held:.1%}"
+    else:
+        saving = "n/a (too small to tell)"
+    return (
+        f"{label:>5} memory dict={held / 1024:.0f}KiB"
+        f" compact={compact / 1024:.0f}KiB saving={saving}"
+    )
+
+
+def compare(args):
+    with open(args.base) as f:
+        base = {result["label"]: result for result in json.load(f)["results"]}
+    with open(args.new) as f:
+        new = {result["label"]: result for result in json.load(f)["results"]}
+
+    regressions = []
+    print(f"{'size':>5} {'stage':<13} {'base ms':>10} {'new ms':>10} {'change':>8}")
+    for label, result in new.items():
+        if label not in base:
+            continue
+        for stage, timing in result["stages"].items():
+            if stage not in base[label]["stages"]:
+                continue
+            before = base[label]["stages"][stage][args.statistic]
+            after = timing[args.statistic]
+            change = (after - before) / before if before else 0.0
+            flag = ""
+            if change > args.threshold and after - before > args.min_time:
+                flag = "  REGRESSION"
+                regressions.append((label, stage, change))
+            print(
+                f"{label:>5} {stage:<13} {before * 1000:>10.2f} {after * 1000:>10.2f}"
+                f" {change:>+8.1%}{flag}"
+            )
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the markdown preview pipeline."
+    )
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    run_parser = commands.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--sizes", default=SIZES, help=f"default: {SIZES}")
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("-o", "--output", help="write JSON here, not stdout")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser("compare", help="compare two runs")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument(
+        "--threshold", type=float, default=0.1, help="relative slowdown to flag"
+    )
+    compare_parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.0005,
+        help="ignore slowdowns smaller than this many seconds",
+    )
+    compare_parser.add_argument(
+        "--statistic", choices=("min", "median"), default="median"
+    )
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,16 @@
+"""
+Import the plugin package headlessly, with the stub ``sublime`` modules.
+"""
+import importlib
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "stubs"))
+sys.path.insert(0, str(ROOT.parent))
+
+# the package is named after its directory, which depends on how it was
+# installed ("SublimeMarkdownPreview" under Packages/)
+plugin = importlib.import_module(ROOT.name)
+mistune = importlib.import_module(ROOT.name + ".vendor.mistune")
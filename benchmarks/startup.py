@@ -0,0 +1,60 @@
+"""
+Time importing the plugin in a fresh interpreter, which Sublime does for
+every user at startup, and building its parsers, which ``plugin_loaded``
+leaves to the async thread.
+
+    python -m benchmarks.startup [--repeat 20]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+from .plugin import ROOT
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+from benchmarks.plugin import plugin
+imported = time.perf_counter()
+modules = sum(name.startswith(plugin.__name__ + ".") for name in sys.modules)
+plugin.parsers.build()
+built = time.perf_counter()
+print(json.dumps({
+    "import": imported - start,
+    "build": built - imported,
+    "modules": modules,
+}))
+"""
+
+
+def sample():
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD],
+        cwd=ROOT,
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    ).stdout
+    return json.loads(output)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    samples = [sample() for _ in range(args.repeat)]
+    for key in ("import", "build"):
+        times = [s[key] * 1000 for s in samples]
+        print(
+            f"{key:<8} median {statistics.median(times):7.2f}ms"
+            f"  min {min(times):7.2f}ms"
+        )
+    print(f"modules  {samples[0]['modules']} of the plugin's imported at startup")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,14 @@
+"""
+Just enough of Sublime Text's ``sublime_plugin`` module to import the
+plugin outside of the editor.
+"""
+
+
+class TextCommand:
+    def __init__(self, view):
+        self.view = view
+
+
+class ViewEventListener:
+    def __init__(self, view):
+        self.view = view
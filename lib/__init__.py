@@ -1,13 +1,34 @@
 import functools
 import html
 import importlib
-import operator
+import sys
+import threading
 from textwrap import dedent
 
-from . import _debounce
+from ..vendor.mistune.renderers import BaseRenderer
+
+# reloaded along with the plugin, the modules are already imported, and
+# have to be reloaded to pick up changes
+_reloading = f"{__name__}._debounce" in sys.modules
+
+from . import _debounce, _disk, _incremental, _memo, _phantoms, _worker
+
+if _reloading:
+    importlib.reload(_debounce)
+    importlib.reload(_disk)
+    importlib.reload(_incremental)
+    importlib.reload(_memo)
+    importlib.reload(_phantoms)
+    importlib.reload(_worker)
 
-importlib.reload(_debounce)
 debounce = _debounce.debounce
+set_timeout = _debounce.set_timeout
+DiskCache = _disk.DiskCache
+IncrementalDocument = _incremental.IncrementalDocument
+RenderCache = _memo.RenderCache
+HtmlCache = _memo.HtmlCache
+PhantomBlocks = _phantoms.PhantomBlocks
+RenderWorker = _worker.RenderWorker
 
 NL = "\n"
 BR = "<br/>"
@@ -15,151 +36,36 @@ BRNL = BR + NL
 NBSP = "&nbsp;"
 
 
-class Ast2HTML:
+class Minihtml:
     """
-    Transform mistunes AST into a minihtml-compatible format.
+    The minihtml markup of each kind of markdown node, given the node's
+    already rendered content.
     """
 
     def newline(self):
         return ""
 
-    def _estimate_inline_width(self, **kwargs):
-        if kwargs["type"] == "text":
-            return len(kwargs["text"])
-        if kwargs["type"] == "image":
-            return 0
-        return sum(self._estimate_inline_width(**child) for child in kwargs["children"])
-
-    def _get_inline_text(self, **kwargs):
-        if kwargs["type"] == "text":
-            return kwargs["text"]
-
-        if kwargs["type"] == "image":
-            return ""
-
-        return "".join(self._get_inline_text(**child) for child in kwargs["children"])
-
-    def _estimate_table_cell_width(self, children, **kwargs):
-        return sum(self._estimate_inline_width(**child) for child in children)
-
-    def _estimate_table_head_widths(self, children, **kwargs):
-        return [
-            functools.reduce(
-                max,
-                (self._estimate_table_cell_width(**child) for child in children),
-            )
-        ]
-
-    def _estimate_table_row_widths(self, children, **kwargs):
-        return [self._estimate_table_cell_width(**child) for child in children]
-
-    def _estimate_table_body_widths(self, children, **kwargs):
-        return [self._estimate_table_row_widths(**child) for child in children]
-
-    def _get_cell_text(self, children, align, width, **kwargs):
-        text_width = len("".join(self._get_inline_text(**child) for child in children))
-        content = "".join(self.transform(**child) for child in children)
-        padding = width - text_width
-        if align == "right":
-            content = NBSP * padding + content
-        elif align == "center":
-            lpad = padding // 2
-            rpad = padding - lpad
-            content = NBSP * lpad + content + NBSP * rpad
-        else:
-            content = content + NBSP * padding
-
-        return content
-
-    def _print_table_head(self, children, column_widths, **kwargs):
-        header_separator = (
-            f'+={"=+=".join("=" * column_width for column_width in column_widths)}=+'
-        )
-        columns = [
-            self._get_cell_text(**child, width=width)
-            for child, width in zip(children, column_widths)
-        ]
-        columns = [text for text in columns if isinstance(text, str)]
-
-        return [header_separator, f"| {' | '.join(columns)} |", header_separator]
-
-    def _print_table_row(self, children, column_widths, **kwargs):
-        columns = [
-            self._get_cell_text(**child, width=width)
-            for child, width in zip(children, column_widths)
-        ]
-        text_widths = [self._estimate_table_cell_width(**child) for child in children]
-        columns = [text for text in columns if isinstance(text, str)]
-
-        return f'| {" | ".join(columns)} |'
-
-    def _print_table_body(self, children, column_widths, **kwargs):
-        rows = [
-            self._print_table_row(child["children"], column_widths=column_widths)
-            for child in children
-        ]
-        row_separator = (
-            f'+-{"-+-".join("-" * column_width for column_width in column_widths)}-+'
-        )
-
-        for row in rows:
-            yield row
-            yield row_separator
-
-    def _estimate_table_widths(self, children, **kwargs):
-
-        row_widths = functools.reduce(
-            operator.add,
-            (
-                [self._estimate_table_row_widths(**child)]
-                if child["type"] == "table_head"
-                else self._estimate_table_body_widths(**child)
-                for child in children
-            ),
-        )
-        return [max(row_width) for row_width in zip(*row_widths)]
-
-    def _get_table_text(self, children, **kwargs):
-        column_widths = self._estimate_table_widths(children, **kwargs)
-        for child in children:
-            if child["type"] == "table_head":
-                yield from self._print_table_head(
-                    child["children"], column_widths=column_widths
-                )
-            else:
-                yield from (
-                    self._print_table_body(
-                        child["children"], column_widths=column_widths
-                    )
-                )
-
-    def table(self, *, children, **kwargs):
-        table = f"<pre>{BRNL.join(self._get_table_text(children, **kwargs))}</pre>"
-        return f"{BRNL}{table}{BRNL}"
-
     def text(self, text):
         # Replace all spaces with a nbsp entity, since minihtml
         # doesn't have a CSS white-space property
         return html.escape(text).replace(" ", NBSP)
 
-    def emphasis(self, children):
-        return f'<em>{"".join(self.transform(**child) for child in children)}</em>'
+    def emphasis(self, text):
+        return f"<em>{text}</em>"
 
-    def strong(self, children):
-        return (
-            f'<strong>{"".join(self.transform(**child) for child in children)}</strong>'
-        )
+    def strong(self, text):
+        return f"<strong>{text}</strong>"
 
-    def link(self, link, children: list, title):
+    def link(self, link, text, title=None):
         return dedent(
             f"""\
                 <a
                     src="{html.escape(link) }"
-                >{"".join(self.transform(**child) for child in children)}</a>
+                >{text}</a>
             """
         )
 
-    def image(self, src, alt, title):
+    def image(self, src, alt="", title=None):
         return dedent(
             f"""\
                 <img
@@ -176,26 +82,23 @@ class Ast2HTML:
     def linebreak(self):
         return "<br/>"
 
-    def inline_html(self, html):
-        return html
+    def inline_html(self, text):
+        return text
 
-    def paragraph(self, children):
-        return f'<p>{"".join(self.transform(**child) for child in children)}</p>'
+    def paragraph(self, text):
+        return f"<p>{text}</p>"
 
-    def heading(self, children, level):
+    def heading(self, text, level):
         tag = f"h{level}"
-        content = "".join(self.transform(**child) for child in children)
-        return f"<{tag}>{content}</{tag}>"
+        return f"<{tag}>{text}</{tag}>"
 
     def thematic_break(self):
         return '<div class="thematic-break"></div>'
 
-    def block_text(self, children):
-        text = "".join(self.transform(**child) for child in children)
-
+    def block_text(self, text):
         return text
 
-    def block_code(self, text, info):
+    def block_code(self, text, info=None):
         NL = "\n"
         return dedent(
             f"""\
@@ -207,35 +110,247 @@ class Ast2HTML:
         """
         )
 
-    def block_quote(self, children):
-        NL = "\n"
-        text = f'{"".join(self.transform(**child) for child in children)}'
-
+    def block_quote(self, text):
         return f'<div class="blockquote">{text}</div>'
 
-    def list(self, children, ordered, level, start=None):
-        return f'<ul>{"".join(self.transform(**child) for child in children)}</ul>'
+    def list(self, text, ordered, level, start=None):
+        return f"<ul>{text}</ul>"
 
-    def list_item(self, children, level):
-        return f'<li>{"".join(self.transform(**child) for child in children)}</li>'
+    def list_item(self, text, level):
+        return f"<li>{text}</li>"
 
-    def task_list_item(self, children, checked, **kwargs):
+    def task_list_item(self, text, level, checked):
         checked = "checked" if checked else "unchecked"
         classes = f"task-list-item__checkbox task-list-item__checkbox--{checked}"
         checkbox = f'<div class="{classes}"></div>'
 
-        return f'<li>{checkbox} {"".join(self.transform(**child) for child in children)}</li>'
+        return f"<li>{checkbox} {text}</li>"
 
-    def footnote_item(self, children, key, index):
-        return f'<div>[{html.escape(key)}]: <div style="display: inline-block">{"".join(self.transform(**child) for child in children)}</div></div><br/>'
+    def footnote_item(self, text, key, index):
+        return f'<div>[{html.escape(key)}]: <div style="display: inline-block">{text}</div></div><br/>'
 
     def footnote_ref(self, key, index):
         return f'<div class="footnote__ref">[{html.escape(key)}]</div>'
 
-    def footnotes(self, children, **kwargs):
+    def footnotes(self, text):
+        return text
+
+
+class Ast2HTML(Minihtml):
+    """
+    Transform mistunes AST into a minihtml-compatible format.
+
+    Given a ``RenderCache``, the html of tables (the only blocks the preview
+    lays out through this class) is looked up by their structure before
+    being rendered again.
+    """
+
+    MEMOIZED = frozenset({"table"})
+
+    def __init__(self, cache=None):
+        self.cache = cache
+        self._memoizing = cache is not None
+
+    def _inline_width(self, node):
+        # the number of characters a node shows once rendered
+        type = node["type"]
+        if type == "text" or type == "codespan":
+            return len(node["text"])
+        children = node.get("children")
+        if not children:
+            # images, line breaks and inline html
+            return 0
+        return sum(self._inline_width(child) for child in children)
+
+    def _table_rows(self, children):
+        for child in children:
+            if child["type"] == "table_head":
+                yield True, child["children"]
+            else:
+                for row in child["children"]:
+                    yield False, row["children"]
+
+    def _table_cell(self, content, width, column_width, align):
+        padding = column_width - width
+        if align == "right":
+            return NBSP * padding + content
+        if align == "center":
+            lpad = padding // 2
+            return NBSP * lpad + content + NBSP * (padding - lpad)
+        return content + NBSP * padding
+
+    def table(self, *, children, **kwargs):
+        # Render every cell and measure its width once, keeping a running
+        # maximum per column; a table has as many columns as its shortest row
+        rows = []
+        column_widths = None
+        for is_head, cells in self._table_rows(children):
+            row = []
+            for cell in cells:
+                width = sum(self._inline_width(child) for child in cell["children"])
+                row.append((self._render(cell["children"]), width, cell["align"]))
+            rows.append((is_head, row))
+            if column_widths is None:
+                column_widths = [width for _, width, _ in row]
+            else:
+                column_widths = [
+                    max(column_width, width)
+                    for column_width, (_, width, _) in zip(column_widths, row)
+                ]
+
+        head_separator = f'+={"=+=".join("=" * width for width in column_widths)}=+'
+        row_separator = f'+-{"-+-".join("-" * width for width in column_widths)}-+'
+        lines = []
+        for is_head, row in rows:
+            columns = " | ".join(
+                self._table_cell(content, width, column_width, align)
+                for (content, width, align), column_width in zip(row, column_widths)
+            )
+            if is_head:
+                lines += (head_separator, f"| {columns} |", head_separator)
+            else:
+                lines += (f"| {columns} |", row_separator)
+
+        table = f"<pre>{BRNL.join(lines)}</pre>"
+        return f"{BRNL}{table}{BRNL}"
+
+    def _render(self, children):
         return "".join(self.transform(**child) for child in children)
 
+    def emphasis(self, children):
+        return super().emphasis(self._render(children))
+
+    def strong(self, children):
+        return super().strong(self._render(children))
+
+    def link(self, link, children: list, title):
+        return super().link(link, self._render(children), title)
+
+    def paragraph(self, children):
+        return super().paragraph(self._render(children))
+
+    def heading(self, children, level):
+        return super().heading(self._render(children), level)
+
+    def block_text(self, children):
+        return super().block_text(self._render(children))
+
+    def block_quote(self, children):
+        return super().block_quote(self._render(children))
+
+    def list(self, children, ordered, level, start=None):
+        return super().list(self._render(children), ordered, level, start)
+
+    def list_item(self, children, level):
+        return super().list_item(self._render(children), level)
+
+    def task_list_item(self, children, checked, level=None):
+        return super().task_list_item(self._render(children), level, checked)
+
+    def footnote_item(self, children, key, index):
+        return super().footnote_item(self._render(children), key, index)
+
+    def footnotes(self, children, **kwargs):
+        return super().footnotes(self._render(children))
+
     def transform(self, type, **kwargs):
+        if self._memoizing and type in self.MEMOIZED:
+            return self._transform_memoized(type, kwargs)
         if hasattr(self, type):
             return getattr(self, type)(**kwargs)
         return f"UNHANDLED: {type}"
+
+    def _transform_memoized(self, type, kwargs):
+        key = (type, _memo.structural_hash(kwargs))
+        result = self.cache.get(key)
+        if result is None:
+            # the key already covers the whole subtree, so don't hash
+            # (and cache) its children separately
+            self._memoizing = False
+            try:
+                result = self.transform(type, **kwargs)
+            finally:
+                self._memoizing = True
+            self.cache.put(key, result)
+        return result
+
+
+class Markup(str):
+    """Rendered minihtml, as opposed to text that still needs escaping."""
+
+    __slots__ = ()
+
+
+class MinihtmlRenderer(Minihtml, BaseRenderer):
+    """
+    mistune renderer producing the same markup as ``Ast2HTML``, straight
+    from the parser callbacks instead of through an intermediate AST.
+
+    Tables need the width of every cell before any of them can be laid
+    out, so they are rendered by ``Ast2HTML`` in a deferred sub-pass, see
+    ``defer_tables``.
+    """
+
+    NAME = "minihtml"
+
+    def __init__(self):
+        super().__init__()
+        self._local = threading.local()
+
+    def _get_method(self, name):
+        try:
+            return super()._get_method(name)
+        except AttributeError:
+            return functools.partial(self._unhandled, name)
+
+    def _unhandled(self, name, *args):
+        return f"UNHANDLED: {name}"
+
+    def link(self, link, text=None, title=None):
+        # autolinks pass their text as-is rather than rendered
+        if not isinstance(text, Markup):
+            text = self.text(text or link)
+        return super().link(link, text, title)
+
+    def table(self, render):
+        return render()
+
+    def finalize(self, data):
+        # top-level blocks are separated by newlines, like Ast2HTML's
+        # output joined per AST node, everything else is concatenated
+        depth = getattr(self._local, "depth", 0)
+        self._local.depth = depth + 1
+        try:
+            return Markup((NL if depth == 0 else "").join(data))
+        finally:
+            self._local.depth = depth
+
+
+def defer_tables(ast_markdown):
+    """
+    mistune plugin for ``MinihtmlRenderer``, rendering tables through the
+    AST of ``ast_markdown`` (a Markdown instance using ``AstRenderer`` with
+    the same plugins). The sub-pass still runs in document order; it uses
+    the ``Ast2HTML`` found in ``state["ast2html"]``, if any.
+    """
+
+    def hook(md, tokens, state):
+        return [
+            md.block.token(
+                "table", raw=functools.partial(_render_table, ast_markdown, token, state)
+            )
+            if token["type"] == "table"
+            else token
+            for token in tokens
+        ]
+
+    def plugin(md):
+        md.before_render_hooks.append(hook)
+
+    return plugin
+
+
+def _render_table(md, token, state):
+    (ast,) = md.block.render([token], md.inline, state)
+    transformer = state.get("ast2html") or Ast2HTML()
+    return transformer.transform(**ast)
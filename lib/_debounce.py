@@ -1,57 +1,162 @@
 import functools
+import heapq
 import threading
+import time
+import traceback
 from itertools import count
-from weakref import WeakValueDictionary
 
 counter = count()
 
 
 class SetTimeoutFactory:
+    """
+    Run callbacks after a timeout, all on one long-lived timer thread.
+
+    Pending callbacks sit in a heap ordered by deadline. Cancelling only
+    marks the entry as dead; dead entries are dropped when they reach the
+    top of the heap, or all at once when they make up most of it.
+    """
+
     def __init__(self):
-        self._timers = WeakValueDictionary()
+        self._heap = []
+        self._entries = {}
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = True
 
     def __call__(self, callback, timeout):
         id = next(counter)
-        condition = threading.Condition()
-
-        def target():
-            with condition:
-                if condition.wait(timeout):
-                    return
-            callback()
-
-        self._timers[id] = condition
-        thread = threading.Thread(target=target)
-        thread.start()
+        entry = [time.monotonic() + timeout, id, callback]
+        with self._condition:
+            heapq.heappush(self._heap, entry)
+            self._entries[id] = entry
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="markdown-preview-timer", daemon=True
+                )
+                self._thread.start()
+            if self._heap[0] is entry:
+                self._condition.notify()
         return id
 
     def cancel(self, id):
-        try:
-            condition = self._timers.pop(id)
-        except KeyError:
-            return
-        else:
-            with condition:
-                condition.notify()
+        with self._condition:
+            entry = self._entries.pop(id, None)
+            if entry is None:
+                return
+            entry[2] = None
+            if len(self._heap) > 2 * len(self._entries) + 64:
+                self._heap = [entry for entry in self._heap if entry[2] is not None]
+                heapq.heapify(self._heap)
+
+    def shutdown(self):
+        with self._condition:
+            self._running = False
+            self._heap.clear()
+            self._entries.clear()
+            self._condition.notify()
+
+    def _next(self):
+        # called with the condition held; returns None once shut down
+        while self._running:
+            heap = self._heap
+            if heap and heap[0][2] is None:
+                heapq.heappop(heap)
+                continue
+            if not heap:
+                self._condition.wait()
+                continue
+            delay = heap[0][0] - time.monotonic()
+            if delay > 0:
+                self._condition.wait(delay)
+                continue
+            _, id, callback = heapq.heappop(heap)
+            del self._entries[id]
+            return callback
+        return None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                callback = self._next()
+            if callback is None:
+                return
+            try:
+                callback()
+            except Exception:
+                traceback.print_exc()
 
 
 set_timeout = SetTimeoutFactory()
 
 
 class debounce:
-    def __init__(self, timeout):
+    """
+    Delay calls to a function until they stop coming in for ``timeout``
+    seconds (or however long the callable ``timeout`` says), then make
+    the last one.
+
+    Told how long the work behind each call took end to end (``record``),
+    the delay adapts instead: it follows an exponentially weighted moving
+    average of those times, clamped to ``bounds()`` (a ``(min, max)``
+    pair, in seconds). Given ``busy``, a callable saying whether that
+    work is still under way, a call that comes due meanwhile waits for it
+    to finish; calls made while it waits replace it, so at most one
+    trailing call follows the work in progress.
+    """
+
+    #: how often a call held back by ``busy`` checks again, in seconds
+    POLL = 0.02
+
+    def __init__(self, timeout, bounds=None, busy=None, weight=0.3):
         self.timeout = timeout
+        self.bounds = bounds
+        self.busy = busy
+        # how much a new time counts for in the average
+        self.weight = weight
+        self.average = None
         self.last_id = None
+        self._lock = threading.Lock()
+        self._calls = 0
+
+    def record(self, seconds):
+        """Feed the time the work behind a call took into the average."""
+        if self.average is None:
+            self.average = seconds
+        else:
+            self.average += self.weight * (seconds - self.average)
+
+    def delay(self):
+        if self.bounds is None or self.average is None:
+            timeout = self.timeout
+            return timeout() if callable(timeout) else timeout
+        low, high = self.bounds()
+        return min(max(self.average, low), high)
 
     def __call__(self, fn):
         def _(*args, **kwargs):
+            return self._schedule(functools.partial(fn, *args, **kwargs), self.delay())
+
+        return _
+
+    def _schedule(self, call, delay, seq=None):
+        with self._lock:
+            if seq is None:
+                self._calls += 1
+                seq = self._calls
+            elif seq != self._calls:
+                # a newer call came in meanwhile, and replaces this one
+                return self.last_id
             if self.last_id is not None:
                 set_timeout.cancel(self.last_id)
-            timeout = self.timeout
-            if callable(timeout):
-                timeout = self.timeout()
-
-            self.last_id = set_timeout(functools.partial(fn, *args, **kwargs), timeout)
+            self.last_id = set_timeout(functools.partial(self._fire, call, seq), delay)
             return self.last_id
 
-        return _
+    def _fire(self, call, seq):
+        if self.busy is not None and self.busy():
+            self._schedule(call, self.POLL, seq)
+            return
+        with self._lock:
+            if seq != self._calls:
+                return
+        call()
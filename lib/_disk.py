@@ -0,0 +1,131 @@
+import hashlib
+import os
+import threading
+import traceback
+from collections import OrderedDict
+from pathlib import Path
+
+
+class DiskCache:
+    """
+    Bounded LRU of data kept on disk between sessions, keyed by a text.
+
+    Each entry is a file in ``directory``, named by a hash of the text and
+    of ``version`` (whatever else the data depends on), so a change of
+    either misses rather than reading something stale. Files are accounted
+    by size against ``max_size`` bytes, the least recently used going first;
+    their modification times carry that order over to the next session.
+
+    ``directory``, ``version`` and ``max_size`` may be callables giving
+    them. The directory is asked for (and its files listed) when the cache
+    is first used. Failing to read or write a file counts as a miss.
+    """
+
+    SUFFIX = ".bin"
+
+    def __init__(self, directory, version, max_size=64 << 20):
+        self.directory = directory
+        self.version = version
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._path = None
+        # file name: size, least recently used first
+        self._index = None
+        self._size = 0
+
+    def __repr__(self):
+        return (
+            f"<DiskCache entries={len(self._index or ())} size={self._size} "
+            f"hits={self.hits} misses={self.misses}>"
+        )
+
+    def __contains__(self, text):
+        name = self._name(text)
+        with self._lock:
+            return name in self._entries()
+
+    def get(self, text):
+        name = self._name(text)
+        with self._lock:
+            index = self._entries()
+            if name not in index:
+                self.misses += 1
+                return None
+            path = self._path / name
+            try:
+                data = path.read_bytes()
+                os.utime(path)
+            except OSError:
+                self._remove(name)
+                self.misses += 1
+                return None
+            index.move_to_end(name)
+            self.hits += 1
+            return data
+
+    def put(self, text, data):
+        name = self._name(text)
+        with self._lock:
+            self._entries()
+            path = self._path / name
+            temporary = path.with_suffix(".tmp")
+            try:
+                temporary.write_bytes(data)
+                os.replace(temporary, path)
+            except OSError:
+                traceback.print_exc()
+                return
+            self._remove(name, unlink=False)
+            self._index[name] = len(data)
+            self._size += len(data)
+            max_size = self._option(self.max_size)
+            while self._size > max_size and self._index:
+                self._remove(next(iter(self._index)))
+
+    def discard(self, text):
+        name = self._name(text)
+        with self._lock:
+            self._entries()
+            self._remove(name)
+
+    def _option(self, value):
+        return value() if callable(value) else value
+
+    def _name(self, text):
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(self._option(self.version).encode())
+        digest.update(b"\0")
+        digest.update(text.encode("utf-8", "surrogatepass"))
+        return digest.hexdigest() + self.SUFFIX
+
+    def _entries(self):
+        # called with the lock held; lists the directory on first use
+        if self._index is None:
+            self._path = Path(self._option(self.directory))
+            files = []
+            try:
+                self._path.mkdir(parents=True, exist_ok=True)
+                for entry in os.scandir(self._path):
+                    if entry.name.endswith(self.SUFFIX):
+                        stat = entry.stat()
+                        files.append((stat.st_mtime, entry.name, stat.st_size))
+            except OSError:
+                traceback.print_exc()
+            self._index = OrderedDict(
+                (name, size) for _, name, size in sorted(files)
+            )
+            self._size = sum(self._index.values())
+        return self._index
+
+    def _remove(self, name, unlink=True):
+        # called with the lock held
+        size = self._index.pop(name, None)
+        if size is not None:
+            self._size -= size
+        if unlink:
+            try:
+                (self._path / name).unlink()
+            except OSError:
+                pass
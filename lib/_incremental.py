@@ -0,0 +1,439 @@
+import bisect
+import json
+import re
+import time
+import zlib
+
+from ..vendor.mistune import ParseCancelled
+
+# Block html openers without an end-of-document fallback. Left unterminated
+# they read as a plain paragraph, but typing the terminator anywhere further
+# down turns everything in between into a single block.
+_UNTERMINATED_HTML = re.compile(r"(?:^|\n) {0,3}<[!?]")
+# state keys holding document-wide definitions made while parsing blocks
+_DEFINITIONS = ("def_links", "def_footnotes")
+
+
+class Block:
+    __slots__ = (
+        "start",
+        "end",
+        "html",
+        "footnotes",
+        "definitions",
+        "unterminated",
+        "timed_out",
+    )
+
+    def __init__(
+        self, start, end, html, footnotes, definitions, unterminated, timed_out=False
+    ):
+        self.start = start
+        self.end = end
+        # None for blocks which only define something (links, footnotes)
+        self.html = html
+        # footnote keys referenced from this block, in order
+        self.footnotes = footnotes
+        # link/footnote definitions made by this block, including nested ones
+        self.definitions = definitions
+        self.unterminated = unterminated
+        # shown as plain text for running out of time, which depends on how
+        # busy the machine was rather than on the block
+        self.timed_out = timed_out
+
+
+class _BlockOverrun(Exception):
+    """A block went over the size or time allowed for rendering it."""
+
+
+class _BlockTimeout(_BlockOverrun):
+    """A block went over the time allowed for rendering it."""
+
+
+class _Deadline:
+    """
+    An inline parser which gives up once a block's time is up, checked
+    before each inline pass (the block's parse is over by then).
+    """
+
+    def __init__(self, inline, seconds):
+        self.renderer = inline.renderer
+        self._inline = inline
+        self._deadline = time.perf_counter() + seconds
+
+    def __call__(self, text, state):
+        if time.perf_counter() > self._deadline:
+            raise _BlockTimeout
+        return self._inline(text, state)
+
+
+class _Expiry:
+    """A cancel token for the parser, cancelled once its time is up."""
+
+    __slots__ = ("_deadline",)
+
+    def __init__(self, seconds):
+        self._deadline = time.perf_counter() + seconds
+
+    @property
+    def cancelled(self):
+        return time.perf_counter() > self._deadline
+
+
+class IncrementalDocument:
+    """
+    Keep the rendered blocks of a markdown document around between updates.
+
+    On every update the edited range is located by comparing the new source
+    against the previous one. Only the blocks overlapping that range (plus
+    the block before it, which an edit may merge into) are re-parsed, until
+    the new parse lines up with an old block boundary again; the remaining
+    blocks are reused as-is.
+
+    A block longer than ``max_block_size`` characters, or still rendering
+    after ``max_block_time`` seconds, is shown as plain text (through the
+    renderer's ``block_code``) instead, so that one unlucky block can't
+    hold up the whole preview. The time is checked between the block's
+    inline passes, each of which the size limit keeps short. Parsing the
+    blocks isn't timed at all: each block rule is matched by a single
+    regex call, which can't be stopped part way, so the block rules are
+    only protected by having been made linear (which
+    ``benchmarks/pathological.py`` checks).
+    """
+
+    def __init__(
+        self, md, finalize=str, env=None, max_block_size=None, max_block_time=None
+    ):
+        self._md = md
+        # turns the output of md's renderer into an html string
+        self._finalize = finalize
+        # extra entries for the parser state, for plugins to pick up
+        self._env = env or {}
+        self._max_block_size = max_block_size
+        self._max_block_time = max_block_time
+        self._source = None
+        self._state = None
+        self._blocks = []
+        self._footnotes = ((), None)
+        self.html = ""
+
+    def update(self, source, cancel=None):
+        """
+        Bring the document up to date with ``source``, returning its html.
+
+        Cancelling ``cancel`` (a ``CancelToken``) while the blocks are
+        parsed and rendered stops the update with ``ParseCancelled``,
+        leaving the document as it was.
+        """
+        md = self._md
+        s, fresh_state = md.before_parse(source, {})
+        old = self._source
+        if old is None:
+            return self._render_all(s, fresh_state, cancel)
+        if s == old:
+            return self.html
+
+        prefix = _common_prefix(old, s)
+        suffix = _common_suffix(old, s, min(len(old), len(s)) - prefix)
+        delta = len(s) - len(old)
+        new_end = len(s) - suffix
+
+        blocks = self._blocks
+        starts = [block.start for block in blocks]
+        first = max(bisect.bisect_right(starts, prefix) - 2, 0)
+        if any(block.unterminated for block in blocks[:first]):
+            return self._render_all(s, fresh_state, cancel)
+
+        # parsed into a copy, kept only once the update goes through, so
+        # that a cancelled one leaves no definitions or parser depth behind
+        state = _copy_state(self._state)
+        state["cancel"] = cancel
+        try:
+            parsed = []
+            last = len(blocks)
+            reparse = _iter_blocks(md, s, state, starts[first])
+            for start, end, tokens, definitions in reparse:
+                parsed.append((start, end, tokens, definitions))
+                if end < new_end:
+                    continue
+                # past the edit, the new parse is back in step with the old
+                # one once it ends where an old block started
+                i = bisect.bisect_left(starts, end - delta)
+                if i < len(starts) and starts[i] == end - delta:
+                    last = i
+                    break
+            reparse.close()
+
+            # definitions are document-wide, so changing one means starting over
+            old_definitions = [d for b in blocks[first:last] for d in b.definitions]
+            new_definitions = [d for *_, definitions in parsed for d in definitions]
+            if old_definitions != new_definitions:
+                return self._render_all(s, fresh_state, cancel)
+
+            rendered = [self._render_block(s, state, *args) for args in parsed]
+        finally:
+            del state["cancel"]
+
+        # nothing is changed until the new blocks are all rendered
+        self._source = s
+        self._state = state
+        if delta:
+            for block in blocks[last:]:
+                block.start += delta
+                block.end += delta
+        blocks[first:last] = rendered
+        return self._join()
+
+    def first_blocks(self, source, count):
+        """
+        The html of the first ``count`` blocks of ``source``, rendered under
+        the same limits as an update but leaving the document as it is.
+        Parsing and rendering them stops short once it took
+        ``max_block_time`` in all, or at a block over ``max_block_size``,
+        which is left for an update to show as plain text. Link and
+        footnote definitions further down aren't picked up.
+        """
+        md = self._md
+        s, state = md.before_parse(source, {})
+        state.update(self._env)
+        if self._max_block_time:
+            state["cancel"] = _Expiry(self._max_block_time)
+        pieces = []
+        blocks = _iter_blocks(md, s, state)
+        try:
+            for start, end, tokens, definitions in blocks:
+                if self._max_block_size and end - start > self._max_block_size:
+                    break
+                block = self._render_block(s, state, start, end, tokens, definitions)
+                if block.html is not None:
+                    pieces.append(block.html)
+                if len(pieces) >= count:
+                    break
+        except ParseCancelled:
+            pass
+        finally:
+            blocks.close()
+        return "\n".join(pieces)
+
+    @property
+    def rendered(self):
+        """Whether the document has been rendered (or loaded) yet."""
+        return self._source is not None
+
+    @property
+    def timed_out(self):
+        """Whether any block is shown as plain text for running out of time."""
+        return any(block.timed_out for block in self._blocks)
+
+    def dumps(self):
+        """
+        The rendered blocks as of the last update, serialized (to zlib
+        compressed JSON) for ``loads`` to take up again later.
+        """
+        blocks = [
+            (b.start, b.end, b.html, b.footnotes, b.definitions, b.unterminated)
+            for b in self._blocks
+        ]
+        data = json.dumps(blocks, ensure_ascii=False, separators=(",", ":"))
+        return zlib.compress(data.encode("utf-8", "surrogatepass"))
+
+    def loads(self, source, data):
+        """
+        Take up the blocks serialized by ``dumps`` as the rendered
+        ``source`` (which must be the source they were rendered from),
+        instead of rendering it. Returns the document's html.
+        """
+        blocks = json.loads(zlib.decompress(data).decode("utf-8", "surrogatepass"))
+        s, state = self._md.before_parse(source, {})
+        state.update(self._env)
+        restored = []
+        for start, end, html, footnotes, definitions, unterminated in blocks:
+            # JSON turns the tuples into lists, and link definitions are tuples
+            definitions = tuple(
+                (key, label, tuple(value) if isinstance(value, list) else value)
+                for key, label, value in definitions
+            )
+            for key, label, value in definitions:
+                state[key].setdefault(label, value)
+            restored.append(
+                Block(start, end, html, tuple(footnotes), definitions, unterminated)
+            )
+
+        self._source = s
+        self._state = state
+        self._blocks = restored
+        self._footnotes = ((), None)
+        return self._join()
+
+    def window(self, first_line, last_line, placeholder):
+        """
+        The html of the blocks overlapping source lines ``first_line`` to
+        ``last_line`` as of the last update, for previews too large to show
+        whole. Each run of blocks outside those lines is replaced by
+        ``placeholder(lines)``, ``lines`` being how many source lines it
+        spans. The blocks keep their html between updates, so moving the
+        window around doesn't render anything.
+        """
+        s = self._source or ""
+        pieces = []
+        line = pos = 0
+        # the line the current run of left out blocks started on
+        hidden = None
+        for block in self._blocks:
+            start_line = line + s.count("\n", pos, block.start)
+            if start_line > last_line:
+                break
+            line = start_line + s.count("\n", block.start, block.end)
+            pos = block.end
+            if line < first_line:
+                if hidden is None:
+                    hidden = start_line
+                continue
+            if hidden is not None:
+                pieces.append(placeholder(start_line - hidden))
+                hidden = None
+            if block.html is not None:
+                pieces.append(block.html)
+        else:
+            if hidden is not None:
+                pieces.append(placeholder(line - hidden))
+            footnotes = self._render_footnotes()
+            if footnotes is not None:
+                pieces.append(footnotes)
+            return "\n".join(pieces)
+
+        if hidden is None:
+            hidden = line
+        pieces.append(placeholder(line + s.count("\n", pos) - hidden))
+        return "\n".join(pieces)
+
+    def _render_all(self, s, state, cancel=None):
+        state.update(self._env)
+        state["cancel"] = cancel
+        try:
+            parsed = list(_iter_blocks(self._md, s, state))
+            blocks = [self._render_block(s, state, *args) for args in parsed]
+        finally:
+            del state["cancel"]
+
+        self._source = s
+        self._state = state
+        self._blocks = blocks
+        self._footnotes = ((), None)
+        return self._join()
+
+    def _render_block(self, s, state, start, end, tokens, definitions):
+        if not tokens:
+            return Block(start, end, None, (), definitions, False)
+
+        footnotes = state["footnotes"]
+        mark = len(footnotes)
+        try:
+            html, timed_out = self._render_html(s, state, start, end, tokens)
+            keys = tuple(footnotes[mark:])
+        finally:
+            del footnotes[mark:]
+
+        # any kind of block may hold one (a setext heading underlines it,
+        # say), except for the opener of an html block, which only parses
+        # as one once terminated
+        own = tokens[0]["type"] == "block_html"
+        unterminated = bool(
+            _UNTERMINATED_HTML.search(s, start + 1 if own else max(start - 1, 0), end)
+        )
+        return Block(start, end, html, keys, definitions, unterminated, timed_out)
+
+    def _render_html(self, s, state, start, end, tokens):
+        md = self._md
+        mark = len(state["footnotes"])
+        try:
+            if self._max_block_size and end - start > self._max_block_size:
+                raise _BlockOverrun
+            tokens = md.before_render(tokens, state)
+            html = self._finalize(md.block.render(tokens, self._inline(), state))
+            return html, False
+        except _BlockOverrun as overrun:
+            del state["footnotes"][mark:]
+            html = self._finalize(md.renderer.block_code(s[start:end]))
+            return html, isinstance(overrun, _BlockTimeout)
+
+    def _inline(self):
+        if not self._max_block_time:
+            return self._md.inline
+        return _Deadline(self._md.inline, self._max_block_time)
+
+    def _render_footnotes(self):
+        keys = tuple(key for block in self._blocks for key in block.footnotes)
+        cached_keys, html = self._footnotes
+        if keys == cached_keys:
+            return html
+
+        md = self._md
+        state = self._state
+        state["footnotes"] = list(keys)
+        empty = md.block.render([], md.inline, state)
+        html = self._finalize(md.after_render(empty, state)) or None
+        state["footnotes"] = []
+        self._footnotes = (keys, html)
+        return html
+
+    def _join(self):
+        pieces = [block.html for block in self._blocks if block.html is not None]
+        footnotes = self._render_footnotes()
+        if footnotes is not None:
+            pieces.append(footnotes)
+        self.html = "\n".join(pieces)
+        return self.html
+
+
+def _copy_state(state):
+    """A copy of a parser state, down to the containers parsing changes."""
+    copy = dict(state)
+    for key, value in state.items():
+        if type(value) in (dict, list):
+            copy[key] = value.copy()
+    return copy
+
+
+def _iter_blocks(md, s, state, pos=0):
+    """
+    Like ``BlockParser.iter_blocks``, but also yield the definitions each
+    block made. Every block parses into empty definition dicts, which are
+    then merged into the document's (first definition wins, as usual).
+    """
+    document = {key: state[key] for key in _DEFINITIONS}
+    state.update((key, {}) for key in _DEFINITIONS)
+    try:
+        for start, end, tokens in md.block.iter_blocks(s, state, pos):
+            definitions = []
+            for key in _DEFINITIONS:
+                for label, value in state[key].items():
+                    definitions.append((key, label, value))
+                    document[key].setdefault(label, value)
+                state[key] = {}
+            yield start, end, tokens, tuple(definitions)
+    finally:
+        state.update(document)
+
+
+def _common_prefix(a, b):
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _common_suffix(a, b, limit):
+    la, lb = len(a), len(b)
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[la - mid : la - lo] == b[lb - mid : lb - lo]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
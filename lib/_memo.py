@@ -0,0 +1,152 @@
+import hashlib
+import sys
+import threading
+import zlib
+from collections import OrderedDict
+
+
+def structural_hash(node):
+    """
+    Hash an AST node by its structure. The AST only holds nodes (dicts or
+    compact ``mistune.nodes.Node`` records), lists and scalars, whose
+    ``repr`` spells out the whole subtree (and is mostly computed in C,
+    which beats walking the tree in Python).
+    """
+    return hashlib.blake2b(repr(node).encode(), digest_size=16).digest()
+
+
+class RenderCache:
+    """
+    Bounded LRU of rendered html, keyed on the structural hash of a subtree.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return (
+            f"<RenderCache size={len(self)}/{self.maxsize} "
+            f"hits={self.hits} misses={self.misses}>"
+        )
+
+    def get(self, key):
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = self.misses = 0
+
+
+class HtmlCache:
+    """
+    Bounded LRU of the last html rendered for each buffer, keyed by buffer
+    id along with the change count it was rendered at, so a preview can be
+    reopened without rendering an unchanged buffer again.
+
+    Entries are accounted by their size in memory against ``budget`` bytes
+    (a number, or a callable giving it), least recently used going first.
+    All but the ``hot`` most recent entries are kept zlib-compressed, which
+    takes minihtml down to about a tenth of its size.
+    """
+
+    def __init__(self, budget=16 << 20, hot=2, level=6):
+        self.budget = budget
+        self.hot = hot
+        self.level = level
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        # buffer id: (change count, html as str, or compressed bytes)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return (
+            f"<HtmlCache entries={len(self)} size={self.size}/{self._budget()} "
+            f"hits={self.hits} misses={self.misses}>"
+        )
+
+    def get(self, buffer_id, change_count):
+        with self._lock:
+            entry = self._entries.get(buffer_id)
+            if entry is None or entry[0] != change_count:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(buffer_id)
+            self.hits += 1
+        html = entry[1]
+        if isinstance(html, bytes):
+            html = zlib.decompress(html).decode("utf-8", "surrogatepass")
+        return html
+
+    def put(self, buffer_id, change_count, html):
+        with self._lock:
+            self._discard(buffer_id)
+            self._store(buffer_id, (change_count, html))
+            cold = self._cold()
+        # compressing a large document takes a while, so it's done without
+        # holding up lookups, and dropped if the entry changed meanwhile
+        for key, entry in cold:
+            text = entry[1]
+            data = text.encode("utf-8", "surrogatepass")
+            compressed = (entry[0], zlib.compress(data, self.level))
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    # replacing the value keeps the entry's place in line
+                    self._entries[key] = compressed
+                    self.size += sys.getsizeof(compressed[1]) - sys.getsizeof(text)
+
+    def discard(self, buffer_id):
+        with self._lock:
+            self._discard(buffer_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            self.hits = self.misses = 0
+
+    def _budget(self):
+        return self.budget() if callable(self.budget) else self.budget
+
+    def _store(self, key, entry):
+        # called with the lock held
+        self._entries[key] = entry
+        self.size += sys.getsizeof(entry[1])
+        budget = self._budget()
+        while self.size > budget and self._entries:
+            self._discard(next(iter(self._entries)))
+
+    def _discard(self, key):
+        # called with the lock held
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= sys.getsizeof(entry[1])
+
+    def _cold(self):
+        # called with the lock held; the uncompressed entries past the
+        # most recent ``hot`` ones
+        entries = list(self._entries.items())[: -self.hot or None]
+        return [(key, entry) for key, entry in entries if isinstance(entry[1], str)]
@@ -0,0 +1,90 @@
+import hashlib
+
+
+class PhantomBlocks:
+    """
+    Pick out the blocks of a markdown document worth showing rendered as
+    phantoms under their source: those whose AST holds a node of one of
+    ``types`` (tables, images, task list items and the like).
+
+    Blocks are told apart by a hash of their text, and of the document's
+    link and footnote definitions, which their html also depends on. Only
+    blocks with a hash not seen on the previous update are rendered; the
+    rest keep their html (or their lack of a phantom).
+
+    ``md`` is a Markdown instance using ``AstRenderer``, whose nodes the
+    ``Ast2HTML`` ``transformer`` turns into html.
+    """
+
+    def __init__(self, md, transformer, types):
+        self._md = md
+        self._transformer = transformer
+        self._types = frozenset(types)
+        # block hash: html, or None for blocks without a phantom
+        self._html = {}
+
+    def update(self, source, cancel=None):
+        """
+        The phantoms to show for ``source``, in document order, as
+        ``(hash, line, html)``: ``line`` being the last line of the block
+        (counting from 0) that the phantom goes under.
+        """
+        md = self._md
+        s, state = md.before_parse(source, {})
+        state["cancel"] = cancel
+        try:
+            blocks = list(md.block.iter_blocks(s, state))
+            context = hashlib.blake2b(
+                repr((state["def_links"], state["def_footnotes"])).encode(),
+                digest_size=16,
+            ).digest()
+
+            html = {}
+            phantoms = []
+            line = pos = 0
+            for start, end, tokens in blocks:
+                if not tokens:
+                    continue
+                text = s[start:end].rstrip("\n")
+                digest = hashlib.blake2b(
+                    text.encode("utf-8", "surrogatepass"), key=context, digest_size=16
+                ).digest()
+                if digest not in html:
+                    if digest in self._html:
+                        html[digest] = self._html[digest]
+                    else:
+                        html[digest] = self._render(tokens, state)
+                if html[digest] is None:
+                    continue
+                last = start + len(text)
+                line += s.count("\n", pos, last)
+                pos = last
+                phantoms.append((digest, line, html[digest]))
+        finally:
+            del state["cancel"]
+
+        # blocks gone from the document are forgotten
+        self._html = html
+        return phantoms
+
+    def _render(self, tokens, state):
+        md = self._md
+        footnotes = state["footnotes"]
+        mark = len(footnotes)
+        try:
+            tokens = md.before_render(tokens, state)
+            nodes = md.block.render(tokens, md.inline, state)
+        finally:
+            del footnotes[mark:]
+        if not any(self._holds(node) for node in nodes):
+            return None
+        return "\n".join(self._transformer.transform(**node) for node in nodes)
+
+    def _holds(self, node):
+        # whether the node, or any node under it, is of one of the types
+        if node["type"] in self._types:
+            return True
+        children = node.get("children")
+        if isinstance(children, list):
+            return any(self._holds(child) for child in children)
+        return False
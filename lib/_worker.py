@@ -0,0 +1,153 @@
+import threading
+import traceback
+
+from ..vendor.mistune import CancelToken, ParseCancelled
+
+
+class RenderWorker:
+    """
+    Run render jobs on a bounded pool of background threads, newest
+    request wins.
+
+    Jobs are submitted under a key (a view) with a generation (the view's
+    change count). A pending job is replaced by any newer one for the same
+    key, and a finished job only reports its result if nothing newer was
+    submitted in the meantime. A job already running is cancelled through
+    its ``CancelToken`` instead.
+
+    At most one job per key runs at a time. Of the keys with a job
+    pending, a free thread takes the one ``priority(key)`` ranked lowest
+    when it was submitted, oldest first among equals. ``priority`` is
+    called on the submitting thread, before the worker's lock is taken,
+    so it may be slow or use APIs bound to that thread. ``threads`` (a
+    number, or a callable giving it, asked when the first job comes in)
+    bounds the size of the pool.
+    """
+
+    def __init__(self, threads=1, priority=None):
+        self.threads = threads
+        self.priority = priority
+        self._pending = {}
+        self._latest = {}
+        # key: (generation, cancel token) of the jobs running now
+        self._current = {}
+        self._condition = threading.Condition()
+        self._pool = []
+        self._running = True
+
+    def submit(self, key, generation, job, on_done, replace=True):
+        """
+        Run ``job(cancel)`` in the background and pass its result to
+        ``on_done`` (on the worker thread) unless it was superseded.
+        ``cancel`` is a ``CancelToken`` that is cancelled once a newer
+        generation replaces the job while it runs; the job can hand it
+        to the parser, or ignore it.
+
+        Without ``replace``, the job is dropped if one is already pending
+        for ``key``.
+        """
+        rank = None if self.priority is None else self.priority(key)
+        with self._condition:
+            if generation < self._latest.get(key, generation):
+                return
+            if not replace and key in self._pending:
+                return
+            if replace:
+                self._cancel(key, generation)
+            self._latest[key] = generation
+            self._pending.pop(key, None)
+            self._pending[key] = (generation, rank, job, on_done)
+            self._grow()
+            self._condition.notify()
+
+    def is_current(self, key, generation):
+        with self._condition:
+            return self._latest.get(key) == generation
+
+    def is_busy(self, key):
+        """Whether a job for ``key`` is waiting or running."""
+        with self._condition:
+            return key in self._pending or key in self._current
+
+    def forget(self, key):
+        with self._condition:
+            self._cancel(key)
+            self._pending.pop(key, None)
+            self._latest.pop(key, None)
+
+    def shutdown(self):
+        with self._condition:
+            self._running = False
+            for _, cancel in self._current.values():
+                cancel.cancel()
+            self._pending.clear()
+            self._condition.notify_all()
+
+    def _grow(self):
+        # called with the condition held; starts another thread while
+        # there are more pending jobs than idle threads, up to the bound
+        threads = self.threads() if callable(self.threads) else self.threads
+        idle = len(self._pool) - len(self._current)
+        if len(self._pool) < max(threads or 1, 1) and len(self._pending) > idle:
+            thread = threading.Thread(
+                target=self._run,
+                name=f"markdown-preview-render-{len(self._pool)}",
+                daemon=True,
+            )
+            self._pool.append(thread)
+            thread.start()
+
+    def _cancel(self, key, generation=None):
+        # called with the condition held; cancels the running job for key
+        # if it's older than generation
+        current = self._current.get(key)
+        if current is not None:
+            if generation is None or current[0] < generation:
+                current[1].cancel()
+
+    def _pick(self):
+        # called with the condition held; the pending key to run next, or
+        # None if every key pending already has a job running
+        keys = [key for key in self._pending if key not in self._current]
+        if not keys or self.priority is None:
+            return next(iter(keys), None)
+        # min keeps the first (oldest) of equally ranked keys
+        return min(keys, key=lambda key: self._pending[key][1])
+
+    def _next(self):
+        # called with the condition held; returns None once shut down
+        while self._running:
+            key = self._pick()
+            if key is not None:
+                generation, _, job, on_done = self._pending.pop(key)
+                if self._latest.get(key) != generation:
+                    continue
+                cancel = CancelToken()
+                self._current[key] = (generation, cancel)
+                return key, generation, job, on_done, cancel
+            self._condition.wait()
+        return None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                task = self._next()
+            if task is None:
+                return
+            key, generation, job, on_done, cancel = task
+            try:
+                result = job(cancel)
+            except ParseCancelled:
+                continue
+            except Exception:
+                traceback.print_exc()
+                continue
+            finally:
+                with self._condition:
+                    del self._current[key]
+                    # a job for the same key may have come in meanwhile,
+                    # and been passed over by the idle threads
+                    if key in self._pending:
+                        self._condition.notify()
+            if self.is_current(key, generation):
+                on_done(result)
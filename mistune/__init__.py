@@ -1,4 +1,5 @@
 from .markdown import Markdown
+from .cancel import CancelToken, ParseCancelled
 from .block_parser import BlockParser
 from .inline_parser import InlineParser
 from .renderers import AstRenderer, HTMLRenderer
@@ -6,13 +7,17 @@ from .plugins import PLUGINS
 from .util import escape, escape_url, escape_html, unikey
 
 
-def create_markdown(escape=True, hard_wrap=False, renderer=None, plugins=None):
+def create_markdown(escape=True, hard_wrap=False, renderer=None, plugins=None,
+                    compact=False):
     """Create a Markdown instance based on the given condition.
 
     :param escape: Boolean. If using html renderer, escape html.
     :param hard_wrap: Boolean. Break every new line into ``<br>``.
     :param renderer: renderer instance or string of ``html`` and ``ast``.
     :param plugins: List of plugins, string or callable.
+    :param compact: Boolean. Build tokens (and the ``ast`` renderer's
+                    nodes) as compact ``__slots__`` records instead of
+                    dicts, see :mod:`mistune.nodes`.
 
     This method is used when you want to re-use a Markdown instance::
 
@@ -27,7 +32,7 @@ def create_markdown(escape=True, hard_wrap=False, renderer=None, plugins=None):
     if renderer is None or renderer == 'html':
         renderer = HTMLRenderer(escape=escape)
     elif renderer == 'ast':
-        renderer = AstRenderer()
+        renderer = AstRenderer(compact=compact)
 
     if plugins:
         _plugins = []
@@ -38,14 +43,12 @@ def create_markdown(escape=True, hard_wrap=False, renderer=None, plugins=None):
                 _plugins.append(p)
         plugins = _plugins
 
-    return Markdown(renderer, inline=InlineParser(renderer, hard_wrap=hard_wrap), plugins=plugins)
-
-
-html = create_markdown(
-    escape=False,
-    renderer='html',
-    plugins=['strikethrough', 'footnotes', 'table'],
-)
+    return Markdown(
+        renderer,
+        block=BlockParser(compact=compact),
+        inline=InlineParser(renderer, hard_wrap=hard_wrap),
+        plugins=plugins,
+    )
 
 
 def markdown(text, escape=True, renderer=None, plugins=None):
@@ -55,9 +58,10 @@ def markdown(text, escape=True, renderer=None, plugins=None):
 
 __all__ = [
     'Markdown', 'AstRenderer', 'HTMLRenderer',
+    'CancelToken', 'ParseCancelled',
     'BlockParser', 'InlineParser',
     'escape', 'escape_url', 'escape_html', 'unikey',
-    'html', 'create_markdown', 'markdown',
+    'create_markdown', 'markdown',
 ]
 
 __version__ = '2.0.2'
@@ -1,7 +1,9 @@
 import re
-from .scanner import ScannerParser, Matcher
+from .cancel import ParseCancelled
+from .scanner import ScannerParser, Matcher, RuleList
 from .inline_parser import ESCAPE_CHAR, LINK_LABEL
 from .util import unikey
+from .nodes import node, dict_node
 
 _NEW_LINES = re.compile(r'\r\n|\r')
 _BLANK_LINES = re.compile(r'^ +$', re.M)
@@ -53,7 +55,7 @@ class BlockParser(ScannerParser):
 
     AXT_HEADING = re.compile(
         r' {0,3}(#{1,6})(?!#+)(?: *\n+|'
-        r'\s+([^\n]*?)(?:\n+|\s+?#+\s*\n+))'
+        r'\s+([^\n]*?)(?:\n+|(?<!\s)\s+?#+\s*\n+))'
     )
     SETEX_HEADING = re.compile(r'([^\n]+)\n *(=|-){2,}[ \t]*\n+')
     THEMATIC_BREAK = re.compile(
@@ -96,16 +98,20 @@ class BlockParser(ScannerParser):
         'def_link',
     )
 
-    def __init__(self):
+    def __init__(self, compact=False):
         super(BlockParser, self).__init__()
-        self.block_quote_rules = list(self.RULE_NAMES)
-        self.list_rules = list(self.RULE_NAMES)
+        #: token factory, compact ``__slots__`` nodes or plain dicts
+        self.token = node if compact else dict_node
+        self.block_quote_rules = RuleList(self.RULE_NAMES)
+        self.list_rules = RuleList(self.RULE_NAMES)
+        # the rule lists used past the maximum depths, by the rule left out
+        self._capped_rules = {}
 
     def parse_newline(self, m, state):
-        return {'type': 'newline', 'blank': True}
+        return self.token('newline', blank=True)
 
     def parse_thematic_break(self, m, state):
-        return {'type': 'thematic_break', 'blank': True}
+        return self.token('thematic_break', blank=True)
 
     def parse_indent_code(self, m, state):
         text = expand_leading_tab(m.group(0))
@@ -123,10 +129,9 @@ class BlockParser(ScannerParser):
         return self.tokenize_block_code(code + '\n', info, state)
 
     def tokenize_block_code(self, code, info, state):
-        token = {'type': 'block_code', 'raw': code}
         if info:
-            token['params'] = (info, )
-        return token
+            return self.token('block_code', raw=code, params=(info, ))
+        return self.token('block_code', raw=code)
 
     def parse_axt_heading(self, m, state):
         level = len(m.group(1))
@@ -143,15 +148,33 @@ class BlockParser(ScannerParser):
         return self.tokenize_heading(text, level, state)
 
     def tokenize_heading(self, text, level, state):
-        return {'type': 'heading', 'text': text, 'params': (level,)}
+        return self.token('heading', text=text, params=(level,))
+
+    def rule_lists(self):
+        return [
+            self.rules,
+            self.block_quote_rules,
+            self.get_block_quote_rules(self.BLOCK_QUOTE_MAX_DEPTH),
+            self.list_rules,
+            self.get_list_rules(self.LIST_MAX_DEPTH),
+        ]
 
     def get_block_quote_rules(self, depth):
         if depth > self.BLOCK_QUOTE_MAX_DEPTH - 1:
-            rules = list(self.block_quote_rules)
-            rules.remove('block_quote')
-            return rules
+            return self._capped(self.block_quote_rules, 'block_quote')
         return self.block_quote_rules
 
+    def _capped(self, rules, name):
+        # ``rules`` without ``name``, made again only once ``rules`` change,
+        # so that its scanner stays cached
+        key = rules.key if type(rules) is RuleList else '|'.join(rules)
+        cached = self._capped_rules.get(name)
+        if cached is None or cached[0] != key:
+            capped = RuleList(rules)
+            capped.remove(name)
+            cached = self._capped_rules[name] = (key, capped)
+        return cached[1]
+
     def parse_block_quote(self, m, state):
         depth = state.get('block_quote_depth', 0) + 1
         state['block_quote_depth'] = depth
@@ -163,15 +186,17 @@ class BlockParser(ScannerParser):
         text = cleanup_lines(text)
 
         rules = self.get_block_quote_rules(depth)
-        children = self.parse(text, state, rules)
-        state['block_quote_depth'] = depth - 1
-        return {'type': 'block_quote', 'children': children}
+        # restored however the parse ends, a cancelled one included, as
+        # the state may be parsed into again
+        try:
+            children = self.parse(text, state, rules)
+        finally:
+            state['block_quote_depth'] = depth - 1
+        return self.token('block_quote', children=children)
 
     def get_list_rules(self, depth):
         if depth > self.LIST_MAX_DEPTH - 1:
-            rules = list(self.list_rules)
-            rules.remove('list_start')
-            return rules
+            return self._capped(self.list_rules, 'list_start')
         return self.list_rules
 
     def parse_list_start(self, m, state, string):
@@ -195,26 +220,24 @@ class BlockParser(ScannerParser):
 
         depth = len(list_tights)
         rules = self.get_list_rules(depth)
-        children = [
-            self.parse_list_item(item, depth, state, rules)
-            for item in items
-        ]
-        list_tights.pop()
+        try:
+            children = [
+                self.parse_list_item(item, depth, state, rules)
+                for item in items
+            ]
+        finally:
+            list_tights.pop()
         params = (ordered, depth, start)
-        token = {'type': 'list', 'children': children, 'params': params}
+        token = self.token('list', children=children, params=params)
         return token, pos
 
     def parse_list_item(self, text, depth, state, rules):
         text = self.normalize_list_item_text(text)
         if not text:
-            children = [{'type': 'block_text', 'text': ''}]
+            children = [self.token('block_text', text='')]
         else:
             children = self.parse(text, state, rules)
-        return {
-            'type': 'list_item',
-            'params': (depth,),
-            'children': children,
-        }
+        return self.token('list_item', params=(depth,), children=children)
 
     @staticmethod
     def normalize_list_item_text(text):
@@ -242,7 +265,7 @@ class BlockParser(ScannerParser):
 
     def parse_block_html(self, m, state):
         html = m.group(0).rstrip()
-        return {'type': 'block_html', 'raw': html}
+        return self.token('block_html', raw=html)
 
     def parse_def_link(self, m, state):
         key = unikey(m.group(1))
@@ -254,13 +277,13 @@ class BlockParser(ScannerParser):
     def parse_text(self, text, state):
         list_tights = state.get('list_tights')
         if list_tights and list_tights[-1]:
-            return {'type': 'block_text', 'text': text.strip()}
+            return self.token('block_text', text=text.strip())
 
         tokens = []
         for s in _PARAGRAPH_SPLIT.split(text):
             s = s.strip()
             if s:
-                tokens.append({'type': 'paragraph', 'text': s})
+                tokens.append(self.token('paragraph', text=s))
         return tokens
 
     def parse(self, s, state, rules=None):
@@ -269,12 +292,38 @@ class BlockParser(ScannerParser):
 
         return list(self._scan(s, state, rules))
 
+    def iter_blocks(self, s, state, pos=0):
+        """Yield ``(start, end, tokens)`` for each top-level block of ``s``.
+
+        Text runs are split at blank lines so that every paragraph is a
+        block of its own. Parsing ``s`` from any yielded ``start`` gives
+        the same blocks as parsing it from the beginning, which is what
+        lets callers re-parse only part of a document.
+        """
+        sc = self._create_scanner(self.rules)
+        for start, end, tok in sc.iter_spans(s, state, _keep_text, pos):
+            if isinstance(tok, str):
+                offset = start
+                for m in _PARAGRAPH_SPLIT.finditer(tok):
+                    split = offset + m.end()
+                    yield start, split, self.parse_text(s[start:split], state)
+                    start = split
+                if start < end:
+                    yield start, end, self.parse_text(s[start:end], state)
+            elif tok:
+                yield start, end, [tok]
+            else:
+                yield start, end, []
+
     def render(self, tokens, inline, state):
         data = self._iter_render(tokens, inline, state)
         return inline.renderer.finalize(data)
 
     def _iter_render(self, tokens, inline, state):
+        cancel = state.get('cancel')
         for tok in tokens:
+            if cancel is not None and cancel.cancelled:
+                raise ParseCancelled()
             method = inline.renderer._get_method(tok['type'])
             if 'blank' in tok:
                 yield method()
@@ -293,6 +342,10 @@ class BlockParser(ScannerParser):
                 yield method(children)
 
 
+def _keep_text(text, state):
+    return text
+
+
 def cleanup_lines(s):
     s = _NEW_LINES.sub('\n', s)
     s = _BLANK_LINES.sub('', s)
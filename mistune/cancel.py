@@ -0,0 +1,22 @@
+class ParseCancelled(Exception):
+    """Raised out of a parse whose :class:`CancelToken` was cancelled."""
+
+
+class CancelToken(object):
+    """Stop a parse that is running on another thread.
+
+    The token is passed to :meth:`Markdown.parse`, which keeps it in the
+    parse state as ``state['cancel']``. The block and inline scanners and
+    the render loop check it before every token, and raise
+    :class:`ParseCancelled` once :meth:`cancel` has been called. Checking
+    is a single attribute lookup, which is cheaper than counting tokens
+    or reading the clock to check less often.
+    """
+
+    __slots__ = ('cancelled',)
+
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
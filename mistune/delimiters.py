@@ -0,0 +1,398 @@
+"""Find emphasis and links without regex backtracking.
+
+The underscore emphasis pattern matches its content with ``[\\s\\S]*?``.
+Where a run of ``_`` has no closer, every attempt to match one walks (and
+backtracks over) the rest of the text, which makes a paragraph full of
+unclosed ``_`` quadratic. Link destinations do the same up to the next
+whitespace, over a run of unclosed ``(``.
+
+Instead, :class:`DelimiterScanner` indexes the delimiter runs of such a
+text once. An index answers, in constant or near-constant time, whether a
+delimiter could open a match at all; only then is the rule's own regex
+run there, so what is matched (and how it renders) stays exactly what the
+regex matches. Failed openers are never looked at again, and successful
+matches don't overlap, so each text is scanned in a single pass.
+
+Building the indexes costs more than the regex spends on ordinary text,
+so a rule is only indexed in texts that look pathological for it. Either
+way the output is the same.
+"""
+import re
+from bisect import bisect_left
+from itertools import islice
+
+from .cancel import ParseCancelled
+from .scanner import Scanner
+from .util import PUNCTUATION, LINK_TEXT
+
+__all__ = [
+    'DelimiterScanner', 'Underscores', 'Brackets', 'Links', 'register',
+]
+
+_PUNCTUATION = frozenset(
+    re.findall('[' + PUNCTUATION + ']', ''.join(map(chr, range(128))))
+)
+
+#: rule patterns matched with the help of an index, and its class
+INDEXED = {}
+
+#: texts shorter than this go to the combined regex: the backtracking is
+#: bounded by their length, and cheaper than building the indexes
+SHORT_TEXT = 1024
+
+#: unclosed openers a text needs before indexing them pays off
+UNMATCHED = 32
+
+
+def register(pattern, index_cls):
+    """Index the openers of the rule ``pattern`` with ``index_cls``."""
+    INDEXED[pattern] = index_cls
+
+
+class Openers(object):
+    """The possible openers of one kind of delimiter in a text, in order."""
+
+    #: the delimiter character
+    CHAR = None
+
+    def __init__(self, string, regex):
+        self.string = string
+        self.regex = regex
+        self.positions = _find_all(string, self.CHAR)
+        self._index = 0
+        self._hit = None
+
+    @classmethod
+    def pathological(cls, string):
+        """Whether the rule's regex would backtrack badly over ``string``.
+
+        A wrong guess only costs time, never changes the output.
+        """
+        return cls.CHAR in string
+
+    def could_match(self, pos):
+        """False if the rule can't match at ``pos``, else True."""
+        raise NotImplementedError
+
+    def first(self, pos, limit):
+        """The rule's first match starting between ``pos`` and ``limit``.
+
+        ``pos`` may only ever grow between calls: openers found not to
+        match are skipped from then on.
+        """
+        hit = self._hit
+        if hit is not None:
+            if hit.start() >= pos:
+                return hit if hit.start() <= limit else None
+            self._hit = None
+
+        positions = self.positions
+        count = len(positions)
+        i = self._index
+        if i < count and positions[i] < pos:
+            i = bisect_left(positions, pos, i)
+        while i < count and positions[i] <= limit:
+            p = positions[i]
+            i += 1
+            if self.could_match(p):
+                hit = self.regex.match(self.string, p)
+                if hit is not None:
+                    self._index = i
+                    self._hit = hit
+                    return hit
+        self._index = i
+        return None
+
+
+class Underscores(Openers):
+    """Openers of ``InlineParser.UNDERSCORE_EMPHASIS``."""
+
+    CHAR = '_'
+
+    # runs that can close emphasis, and runs that can open it. Starting
+    # with the ``_`` lets the regex engine skip ahead to the next one
+    _RUNS = re.compile(
+        r'_(?:(?P<close>(?<=[^\s_]_)_*(?!_|[^\s' + PUNCTUATION + r']))|'
+        r'(?P<open>(?<!\w_)_*(?=[^\s_])))'
+    )
+
+    @classmethod
+    def pathological(cls, string):
+        # every opener without a closer makes the regex walk to the end
+        if string.count('_') <= UNMATCHED:
+            return False
+        unmatched = 0
+        for run in cls._RUNS.finditer(string):
+            if run.lastgroup == 'open':
+                unmatched += 1
+            elif unmatched:
+                unmatched -= 1
+        return unmatched > UNMATCHED
+
+    def __init__(self, string, regex):
+        super(Underscores, self).__init__(string, regex)
+        # The content is ``[\s\S]*?``, so the rule matches as long as some
+        # closer ends its content after the opener; keep the last content
+        # end each length of closer allows.
+        s = string
+        length = len(s)
+        self.last = {1: -1, 2: -1}
+        for c in self.positions:
+            for m in (1, 2):
+                after = c + m
+                if not s.startswith('_' * m, c) or (
+                    after < length and (s[after] == '_' or not (
+                        s[after].isspace() or s[after] in _PUNCTUATION
+                    ))
+                ):
+                    continue
+                if c > 0 and not s[c - 1].isspace() and s[c - 1] != '_':
+                    end = c - 1
+                elif c > 1 and s[c - 2] == '\\' and s[c - 1] in _PUNCTUATION:
+                    end = c - 2
+                else:
+                    continue
+                if end > self.last[m]:
+                    self.last[m] = end
+
+    def could_match(self, pos):
+        s = self.string
+        if pos and (s[pos - 1].isalnum() or s[pos - 1] == '_'):
+            return False
+        m = 2 if s.startswith('__', pos) else 1
+        q = pos + m
+        if q >= len(s) or s[q] == '_' or s[q].isspace():
+            return False
+        return self.last[m] >= q
+
+
+class Brackets(object):
+    """Where the link text opened by a ``[`` ends, and whether a link
+    destination can follow it.
+    """
+
+    _TEXT_END = re.compile(LINK_TEXT + r'\]')
+    _STOPS = re.compile(r'[\s\x00-\x1f]')
+
+    def __init__(self, string):
+        self.string = string
+        self._parens = None
+
+    def text_end(self, pos):
+        """The ``]`` ending link text opened by the ``[`` at ``pos``."""
+        m = self._TEXT_END.match(self.string, pos + 1)
+        return m.end() - 1 if m else None
+
+    def destination(self, pos):
+        """False if no ``destination "title")`` can follow the ``](`` that
+        ends before ``pos``, else True.
+        """
+        s = self.string
+        if self._parens is None:
+            self._parens = {
+                'open': [
+                    i for i in _find_all(s, '(') if not i or s[i - 1] != '\\'
+                ],
+                'close': _find_all(s, ')'),
+                'angle': _find_all(s, '>'),
+                'backslash': _find_all(s, '\\'),
+                'stop': [m.start() for m in self._STOPS.finditer(s)],
+            }
+        parens = self._parens
+        length = len(s)
+
+        while pos < length and s[pos].isspace():
+            pos += 1
+        close = _next(parens['close'], pos, length)
+        if close == length:
+            return False
+        if s.startswith('<', pos):
+            angle = _next(parens['angle'], pos, length)
+            if _next(parens['close'], angle, length) < length:
+                return True
+
+        # the destination can't hold whitespace; a bare "(" in it has to
+        # be closed (before whitespace or a backslash), and then the link
+        # still needs a ")" of its own
+        stop = _next(parens['stop'], pos, length)
+        group = _next(parens['open'], pos, length)
+        if close < min(group, stop):
+            return True
+        if group >= stop:
+            return _next(parens['close'], stop, length) < length
+        backslash = _next(parens['backslash'], group, length)
+        close = _next(parens['close'], group, length)
+        return (
+            close < min(stop, backslash)
+            and _next(parens['close'], close + 1, length) < length
+        )
+
+
+class Links(Openers):
+    """Openers of ``InlineParser.STD_LINK``, ``[text](url "title")`` and
+    ``![alt](src "title")``.
+    """
+
+    CHAR = '['
+
+    _DESTINATION = re.compile(r'\]\(')
+    _SPACE = re.compile(r'\s')
+
+    @classmethod
+    def pathological(cls, string):
+        # a destination can't hold whitespace, but up to there every "]("
+        # that starts none makes the regex scan the rest of the word. Only
+        # every ``UNMATCHED``-th gap is looked at, which finds any word
+        # with twice as many
+        if string.count('](') <= UNMATCHED:
+            return False
+        starts = [
+            m.start() for m in
+            islice(cls._DESTINATION.finditer(string), 0, None, UNMATCHED)
+        ]
+        search = cls._SPACE.search
+        return any(
+            search(string, start, end) is None
+            for start, end in zip(starts, starts[1:])
+        )
+
+    def __init__(self, string, regex):
+        super(Links, self).__init__(string, regex)
+        self.positions = sorted(self.positions + [
+            i - 1 for i in self.positions if i and string[i - 1] == '!'
+        ])
+        self.brackets = Brackets(string)
+
+    def could_match(self, pos):
+        if self.string[pos] == '!':
+            pos += 1
+        end = self.brackets.text_end(pos)
+        return (
+            end is not None and self.string.startswith('(', end + 1)
+            and self.brackets.destination(end + 2)
+        )
+
+
+class DelimiterScanner(Scanner):
+    """A :class:`Scanner` that leaves the rules in :data:`INDEXED` to their
+    index in texts that are :meth:`pathological` for them, keeping the rule
+    order: at a given position, whichever rule comes first in the lexicon
+    wins, as with a single combined regex.
+
+    Other texts are scanned with the combined regex of the whole lexicon.
+    """
+
+    #: texts shorter than this aren't checked for pathologies at all
+    SHORT_TEXT = SHORT_TEXT
+
+    def __init__(self, lexicon):
+        super(DelimiterScanner, self).__init__(lexicon)
+        self.indexed = []
+        for order, (pattern, action) in enumerate(lexicon):
+            index_cls = INDEXED.get(pattern)
+            if index_cls is not None:
+                regex = _isolate(lexicon, order)
+                self.indexed.append((order, index_cls, regex, action[1]))
+        # scanners for the rest of the lexicon, by the orders left out
+        self._partials = {}
+
+    def pathological(self, string):
+        """The entries of :attr:`indexed` to leave to their index in
+        ``string``.
+        """
+        return tuple(
+            entry for entry in self.indexed if entry[1].pathological(string)
+        )
+
+    def iter(self, string, state, parse_text):
+        # most texts are short, the content of an emphasis say
+        if len(string) < self.SHORT_TEXT:
+            return Scanner.iter(self, string, state, parse_text)
+        indexed = self.pathological(string)
+        if not indexed:
+            return Scanner.iter(self, string, state, parse_text)
+        indexes = [
+            (order, index_cls(string, regex), method)
+            for order, index_cls, regex, method in indexed
+        ]
+        scanner, orders = self._partial(tuple(entry[0] for entry in indexed))
+        return self._iter(string, state, parse_text, indexes, scanner, orders)
+
+    def _partial(self, left_out):
+        # the scanner of the lexicon without the rules at ``left_out``, and
+        # the order in the lexicon of each rule it has
+        partial = self._partials.get(left_out)
+        if partial is None:
+            orders = [
+                i for i in range(len(self.lexicon)) if i not in left_out
+            ]
+            partial = self._partials[left_out] = (
+                Scanner([self.lexicon[i] for i in orders]), orders)
+        return partial
+
+    def _iter(self, string, state, parse_text, indexes, scanner, orders):
+        search = scanner.search
+        endpos = len(string)
+        cancel = state.get('cancel')
+        pos = 0
+        # searching again from further on can't find what this missed
+        m = search(string, pos)
+        while pos < endpos:
+            if cancel is not None and cancel.cancelled:
+                raise ParseCancelled()
+            if m is not None and m.start() < pos:
+                m = search(string, pos)
+            limit = endpos if m is None else m.start()
+
+            found = None
+            for order, index, method in indexes:
+                hit = index.first(pos, limit)
+                if hit is not None and (
+                        found is None or hit.start() < found[0].start()):
+                    found = (hit, order, method)
+
+            if found is not None and (
+                m is None or found[0].start() < limit
+                or found[1] < orders[m.lastindex - 1]
+            ):
+                match, _, method = found
+            elif m is not None:
+                match = m
+                method = scanner.lexicon[m.lastindex - 1][1][1]
+            else:
+                break
+
+            hole = string[pos:match.start()]
+            if hole:
+                yield parse_text(hole, state)
+            yield method(match, state)
+            pos = match.end()
+
+        hole = string[pos:]
+        if hole:
+            yield parse_text(hole, state)
+
+
+def _isolate(lexicon, order):
+    # the combined regex of ``lexicon`` with every rule but one disabled:
+    # that rule's matches get the same group numbers as in the combined
+    # scanner, where rules read groups that their own pattern lacks
+    return re.Scanner([
+        (pattern if i == order else '(?!)', None)
+        for i, (pattern, _) in enumerate(lexicon)
+    ]).scanner
+
+
+def _next(positions, pos, default):
+    # the first of the sorted ``positions`` at or after ``pos``
+    i = bisect_left(positions, pos)
+    return positions[i] if i < len(positions) else default
+
+
+def _find_all(string, char):
+    positions = []
+    i = string.find(char)
+    while i != -1:
+        positions.append(i)
+        i = string.find(char, i + 1)
+    return positions
@@ -1,7 +1,23 @@
-from .base import Directive
-from .admonition import Admonition
-from .include import DirectiveInclude
-from .toc import DirectiveToc, extract_toc_items, render_toc_ul
+import importlib
+
+#: the module each name is imported from, the first time it's asked for
+_MODULES = {
+    'Directive': 'base',
+    'Admonition': 'admonition',
+    'DirectiveInclude': 'include',
+    'DirectiveToc': 'toc',
+    'extract_toc_items': 'toc',
+    'render_toc_ul': 'toc',
+}
+
+
+def __getattr__(name):
+    try:
+        module = _MODULES[name]
+    except KeyError:
+        raise AttributeError(
+            'module %r has no attribute %r' % (__name__, name)) from None
+    return getattr(importlib.import_module('.' + module, __name__), name)
 
 
 __all__ = [
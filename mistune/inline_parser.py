@@ -1,6 +1,9 @@
 import re
-from .scanner import ScannerParser
-from .util import PUNCTUATION, ESCAPE_TEXT, escape_url, unikey
+from .scanner import ScannerParser, RuleList
+from .delimiters import DelimiterScanner, Underscores, Links, register
+from .util import (
+    PUNCTUATION, ESCAPE_TEXT, LINK_TEXT, LINK_LABEL, escape_url, unikey,
+)
 
 HTML_TAGNAME = r'[A-Za-z][A-Za-z0-9-]*'
 HTML_ATTRIBUTES = (
@@ -8,11 +11,11 @@ HTML_ATTRIBUTES = (
     r'(?:\s*=\s*(?:[^ "\'=<>`]+|\'[^\']*?\'|"[^\"]*?"))?)*'
 )
 ESCAPE_CHAR = re.compile(r'\\([' + PUNCTUATION + r'])')
-LINK_TEXT = r'(?:\[(?:\\.|[^\[\]\\])*\]|\\.|`[^`]*`|[^\[\]\\`])*?'
-LINK_LABEL = r'(?:[^\\\[\]]|' + ESCAPE_TEXT + r'){0,1000}'
 
 
 class InlineParser(ScannerParser):
+    scanner_cls = DelimiterScanner
+
     ESCAPE = ESCAPE_TEXT
 
     #: link or email syntax::
@@ -105,11 +108,14 @@ class InlineParser(ScannerParser):
             #: every new line becomes <br>
             self.LINEBREAK = r' *\n(?!\s*$)'
         self.renderer = renderer
-        rules = list(self.RULE_NAMES)
+        rules = RuleList(self.RULE_NAMES)
         rules.remove('ref_link')
         rules.remove('ref_link2')
         self.ref_link_rules = rules
 
+    def rule_lists(self):
+        return [self.rules, self.ref_link_rules]
+
     def parse_escape(self, m, state):
         text = m.group(0)[1:]
         return 'text', text
@@ -148,6 +154,9 @@ class InlineParser(ScannerParser):
         key = unikey(m.group(2) or text)
         def_links = state.get('def_links')
         if not def_links or key not in def_links:
+            if self._create_scanner(self.ref_link_rules).search(line) is None:
+                # nothing inside to rescan, as in most unresolved references
+                return self.parse_text(line, state)
             return list(self._scan(line, state, self.ref_link_rules))
 
         link, title = def_links.get(key)
@@ -214,3 +223,7 @@ class InlineParser(ScannerParser):
 
     def __call__(self, s, state):
         return self.render(s, state)
+
+
+register(InlineParser.STD_LINK, Links)
+register(InlineParser.UNDERSCORE_EMPHASIS, Underscores)
@@ -24,6 +24,14 @@ class Markdown(object):
     def use(self, plugin):
         plugin(self)
 
+    def warm_up(self):
+        """Compile every scanner the block and inline parsers (with the
+        plugins in use) can reach, so the first parse doesn't pay for it.
+        """
+        self.block.warm_up()
+        self.inline.warm_up()
+        return self
+
     def before_parse(self, s, state):
         s, state = preprocess(s, state)
         for hook in self.before_parse_hooks:
@@ -40,9 +48,15 @@ class Markdown(object):
             result = hook(self, result, state)
         return result
 
-    def parse(self, s, state=None):
+    def parse(self, s, state=None, cancel=None):
+        """Parse and render ``s``. Given a :class:`CancelToken` as
+        ``cancel``, the parse stops with :class:`ParseCancelled` soon
+        after the token is cancelled.
+        """
         if state is None:
             state = {}
+        if cancel is not None:
+            state['cancel'] = cancel
 
         s, state = self.before_parse(s, state)
         tokens = self.block.parse(s, state)
@@ -0,0 +1,137 @@
+"""Compact token and AST nodes.
+
+By default tokens and AST nodes are plain dicts. A compact node holds the
+same data in a ``__slots__`` record instead: the type name and an integer
+type code live on the class, so an instance only stores its field values.
+Every distinct ``(type, fields)`` combination gets a class of its own,
+and the type name doubles as the ``type`` attribute.
+
+Nodes keep the dict interface that renderers and plugins rely on --
+``node['text']``, ``node.get('params')``, ``'children' in node``,
+``**node`` and comparison against dicts all work. Existing fields can be
+assigned, but a node can't grow new keys or change its type; build a new
+one with :func:`node` (or ``dict(node)`` for a mutable copy) instead.
+"""
+from collections.abc import Mapping
+
+__all__ = ['Node', 'node', 'dict_node', 'type_code', 'compact']
+
+_classes = {}
+_type_codes = {}
+
+
+def type_code(name):
+    """Return the integer code for the node type ``name``."""
+    code = _type_codes.get(name)
+    if code is None:
+        code = _type_codes[name] = len(_type_codes)
+    return code
+
+
+class Node(Mapping):
+    __slots__ = ()
+
+    #: node type name, the ``'type'`` key
+    type = None
+    #: integer code of :attr:`type`, shared by every class of that type
+    CODE = None
+    #: names of the remaining keys, in order
+    FIELDS = ()
+    #: all keys, ``'type'`` first
+    KEYS = ('type',)
+
+    def __init__(self, *values):
+        for name, value in zip(self.FIELDS, values):
+            setattr(self, name, value)
+
+    def __reduce__(self):
+        # the classes are made on demand, so pickle what makes one instead
+        values = tuple(getattr(self, name) for name in self.FIELDS)
+        return _restore, (self.type, self.FIELDS, values)
+
+    def __getitem__(self, key):
+        if key in self.KEYS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in self.FIELDS:
+            raise KeyError(
+                '{!r} node has no field {!r}'.format(self.type, key))
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.KEYS
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+    def keys(self):
+        return self.KEYS
+
+    def get(self, key, default=None):
+        if key in self.KEYS:
+            return getattr(self, key)
+        return default
+
+    def __repr__(self):
+        fields = ', '.join(
+            '{}={!r}'.format(name, getattr(self, name))
+            for name in self.FIELDS
+        )
+        return '{}({})'.format(self.type, fields)
+
+
+def _define(type_name, fields):
+    clashes = [field for field in fields if hasattr(Node, field)]
+    if clashes:
+        raise ValueError('reserved node field names: {}'.format(clashes))
+
+    cls = type('Node_' + type_name, (Node,), {
+        '__slots__': fields,
+        '__module__': __name__,
+        'type': type_name,
+        'CODE': type_code(type_name),
+        'FIELDS': fields,
+        'KEYS': ('type',) + fields,
+    })
+    _classes[(type_name, *fields)] = cls
+    return cls
+
+
+def node(type, **fields):
+    """Create a compact node, the ``__slots__`` counterpart of
+    :func:`dict_node`."""
+    cls = _classes.get((type, *fields))
+    if cls is None:
+        cls = _define(type, tuple(fields))
+    return cls(*fields.values())
+
+
+def _restore(type_name, fields, values):
+    cls = _classes.get((type_name, *fields))
+    if cls is None:
+        cls = _define(type_name, fields)
+    return cls(*values)
+
+
+def dict_node(type, **fields):
+    """Create a node as a plain dict."""
+    return {'type': type, **fields}
+
+
+def compact(token):
+    """Turn a dict node (and any children list) into a compact node."""
+    if isinstance(token, Node):
+        return token
+    fields = {k: v for k, v in token.items() if k != 'type'}
+    children = fields.get('children')
+    if isinstance(children, list):
+        fields['children'] = [
+            compact(child) if isinstance(child, dict) else child
+            for child in children
+        ]
+    return node(token['type'], **fields)
@@ -1,20 +1,53 @@
-from .abbr import plugin_abbr
-from .def_list import plugin_def_list
-from .extra import plugin_strikethrough, plugin_url
-from .footnotes import plugin_footnotes
-from .table import plugin_table
-from .task_lists import plugin_task_lists
-
-PLUGINS = {
-    "url": plugin_url,
-    "strikethrough": plugin_strikethrough,
-    "footnotes": plugin_footnotes,
-    "table": plugin_table,
-    "task_lists": plugin_task_lists,
-    "def_list": plugin_def_list,
-    "abbr": plugin_abbr,
+import importlib
+from collections.abc import Mapping
+
+#: where each plugin lives, as (module, function); modules are imported
+#: the first time one of their plugins is asked for
+_LOCATIONS = {
+    "url": ("extra", "plugin_url"),
+    "strikethrough": ("extra", "plugin_strikethrough"),
+    "footnotes": ("footnotes", "plugin_footnotes"),
+    "table": ("table", "plugin_table"),
+    "task_lists": ("task_lists", "plugin_task_lists"),
+    "def_list": ("def_list", "plugin_def_list"),
+    "abbr": ("abbr", "plugin_abbr"),
 }
 
+
+def _load(module, name):
+    return getattr(importlib.import_module('.' + module, __name__), name)
+
+
+class PluginRegistry(Mapping):
+    """The built-in plugins by name, importing each plugin's module only
+    once the plugin is looked up.
+    """
+
+    def __init__(self, locations):
+        self._locations = locations
+
+    def __getitem__(self, key):
+        return _load(*self._locations[key])
+
+    def __iter__(self):
+        return iter(self._locations)
+
+    def __len__(self):
+        return len(self._locations)
+
+
+PLUGINS = PluginRegistry(_LOCATIONS)
+_FUNCTIONS = {name: (module, name) for module, name in _LOCATIONS.values()}
+
+
+def __getattr__(name):
+    try:
+        return _load(*_FUNCTIONS[name])
+    except KeyError:
+        raise AttributeError(
+            'module %r has no attribute %r' % (__name__, name)) from None
+
+
 __all__ = [
     "PLUGINS",
     "plugin_url",
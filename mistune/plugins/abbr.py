@@ -31,8 +31,7 @@ def after_parse_def_abbr(md, tokens, state):
     if def_abbrs:
         labels = list(def_abbrs.keys())
         abbr_pattern = r'|'.join(re.escape(k) for k in labels)
-        md.inline.register_rule('abbr', abbr_pattern, parse_inline_abbr)
-        md.inline.rules.append('abbr')
+        md.inline.overlay_rule(state, 'abbr', abbr_pattern, parse_inline_abbr)
     return tokens
 
 
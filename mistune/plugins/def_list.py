@@ -13,13 +13,13 @@ def parse_def_list(block, m, state):
             continue
         if line.strip()[0] == ":":
             definition_list_items.append(
-                {"type": "def_list_item", "text": line[1:].strip()}
+                block.token("def_list_item", text=line[1:].strip())
             )
         else:
             definition_list_items.append(
-                {"type": "def_list_header", "text": line.strip()}
+                block.token("def_list_header", text=line.strip())
             )
-    return {"type": "def_list", "children": definition_list_items}
+    return block.token("def_list", children=definition_list_items)
 
 
 def render_html_def_list(text):
@@ -45,7 +45,7 @@ def parse_footnote_item(block, k, i, state):
 
     stripped_text = text.strip()
     if '\n' not in stripped_text:
-        children = [{'type': 'paragraph', 'text': stripped_text}]
+        children = [block.token('paragraph', text=stripped_text)]
     else:
         lines = text.splitlines()
         for second_line in lines[1:]:
@@ -59,11 +59,7 @@ def parse_footnote_item(block, k, i, state):
         if not isinstance(children, list):
             children = [children]
 
-    return {
-        'type': 'footnote_item',
-        'children': children,
-        'params': (k, i)
-    }
+    return block.token('footnote_item', children=children, params=(k, i))
 
 
 def md_footnotes_hook(md, result, state):
@@ -75,7 +71,7 @@ def md_footnotes_hook(md, result, state):
         parse_footnote_item(md.block, k, i + 1, state)
         for i, k in enumerate(footnotes)
     ]
-    tokens = [{'type': 'footnotes', 'children': children}]
+    tokens = [md.block.token('footnotes', children=children)]
     output = md.block.render(tokens, md.inline, state)
     return result + output
 
@@ -6,7 +6,7 @@ TABLE_PATTERN = re.compile(
     r' {0,3}\|(.+)\n *\|( *[-:]+[-| :]*)\n((?: *\|.*(?:\n|$))*)\n*'
 )
 NP_TABLE_PATTERN = re.compile(
-    r' {0,3}(\S.*\|.*)\n *([-:]+ *\|[-| :]*)\n((?:.*\|.*(?:\n|$))*)\n*'
+    r' {0,3}(\S[^\n|]*\|.*)\n *([-:]+ *\|[-| :]*)\n((?:[^\n|]*\|.*(?:\n|$))*)\n*'
 )
 HEADER_SUB = re.compile(r'\| *$')
 HEADER_SPLIT = re.compile(r' *\| *')
@@ -16,31 +16,31 @@ ALIGN_SPLIT = re.compile(r' *\| *')
 def parse_table(self, m, state):
     header = HEADER_SUB.sub('', m.group(1)).strip()
     align = HEADER_SUB.sub('', m.group(2))
-    thead, aligns = _process_table(header, align)
+    thead, aligns = _process_table(self.token, header, align)
 
     text = re.sub(r'(?: *\| *)?\n$', '', m.group(3))
     rows = []
     for i, v in enumerate(text.split('\n')):
         v = re.sub(r'^ *\| *| *\| *$', '', v)
-        rows.append(_process_row(v, aligns))
+        rows.append(_process_row(self.token, v, aligns))
 
-    children = [thead, {'type': 'table_body', 'children': rows}]
-    return {'type': 'table', 'children': children}
+    children = [thead, self.token('table_body', children=rows)]
+    return self.token('table', children=children)
 
 
 def parse_nptable(self, m, state):
-    thead, aligns = _process_table(m.group(1), m.group(2))
+    thead, aligns = _process_table(self.token, m.group(1), m.group(2))
 
     text = re.sub(r'\n$', '', m.group(3))
     rows = []
     for i, v in enumerate(text.split('\n')):
-        rows.append(_process_row(v, aligns))
+        rows.append(_process_row(self.token, v, aligns))
 
-    children = [thead, {'type': 'table_body', 'children': rows}]
-    return {'type': 'table', 'children': children}
+    children = [thead, self.token('table_body', children=rows)]
+    return self.token('table', children=children)
 
 
-def _process_table(header, align):
+def _process_table(token, header, align):
     headers = HEADER_SPLIT.split(header)
     aligns = ALIGN_SPLIT.split(align)
 
@@ -59,43 +59,35 @@ def _process_table(header, align):
             aligns[i] = None
 
         if len(headers) > i:
-            cells.append({
-                'type': 'table_cell',
-                'text': headers[i],
-                'params': (aligns[i], True)
-            })
+            cells.append(token(
+                'table_cell', text=headers[i], params=(aligns[i], True)
+            ))
 
     i += 1
     while i + 1 < len(headers):
-        cells.append({
-            'type': 'table_cell',
-            'text': headers[i],
-            'params': (None, True)
-        })
+        cells.append(token(
+            'table_cell', text=headers[i], params=(None, True)
+        ))
         aligns.append(None)
         i += 1
 
-    thead = {'type': 'table_head', 'children': cells}
+    thead = token('table_head', children=cells)
     return thead, aligns
 
 
-def _process_row(row, aligns):
+def _process_row(token, row, aligns):
     cells = []
     for i, s in enumerate(re.split(r' *(?<!\\)\| *', row)):
         text = re.sub(r'\\\|', '|', s.strip())
         if len(aligns) < i + 1:
-            cells.append({
-                'type': 'table_cell',
-                'text': text,
-                'params': (None, False)
-            })
+            cells.append(token(
+                'table_cell', text=text, params=(None, False)
+            ))
         else:
-            cells.append({
-                'type': 'table_cell',
-                'text': text,
-                'params': (aligns[i], False)
-            })
-    return {'type': 'table_row', 'children': cells}
+            cells.append(token(
+                'table_cell', text=text, params=(aligns[i], False)
+            ))
+    return token('table_row', children=cells)
 
 
 def render_html_table(text):
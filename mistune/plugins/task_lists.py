@@ -7,7 +7,7 @@ TASK_LIST_ITEM = re.compile(r'^(\[[ xX]\])\s+')
 
 
 def task_lists_hook(md, tokens, state):
-    return _rewrite_all_list_items(tokens)
+    return _rewrite_all_list_items(md.block, tokens)
 
 
 def render_ast_task_list_item(children, level, checked):
@@ -46,16 +46,16 @@ def plugin_task_lists(md):
         md.renderer.register('task_list_item', render_ast_task_list_item)
 
 
-def _rewrite_all_list_items(tokens):
-    for tok in tokens:
+def _rewrite_all_list_items(block, tokens):
+    for i, tok in enumerate(tokens):
         if tok['type'] == 'list_item':
-            _rewrite_list_item(tok)
+            tok = tokens[i] = _rewrite_list_item(block, tok)
         if 'children' in tok.keys():
-            _rewrite_all_list_items(tok['children'])
+            _rewrite_all_list_items(block, tok['children'])
     return tokens
 
 
-def _rewrite_list_item(item):
+def _rewrite_list_item(block, item):
     children = item['children']
     if children:
         first_child = children[0]
@@ -71,5 +71,7 @@ def _rewrite_list_item(item):
             else:
                 params = (params[0], True)
 
-            item['type'] = 'task_list_item'
-            item['params'] = params
+            return block.token(
+                'task_list_item', params=params, children=children
+            )
+    return item
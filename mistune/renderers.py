@@ -1,4 +1,5 @@
 from .util import escape, escape_html
+from .nodes import node, dict_node, compact
 
 
 class BaseRenderer(object):
@@ -27,67 +28,68 @@ class BaseRenderer(object):
 class AstRenderer(BaseRenderer):
     NAME = 'ast'
 
+    def __init__(self, compact=False):
+        super(AstRenderer, self).__init__()
+        self.compact = compact
+        #: node factory, compact ``__slots__`` nodes or plain dicts
+        self.node = node if compact else dict_node
+
+    def register(self, name, method):
+        # plugins build their AST nodes as dicts
+        if self.compact:
+            method = _compacting(method)
+        super(AstRenderer, self).register(name, method)
+
     def text(self, text):
-        return {'type': 'text', 'text': text}
+        return self.node('text', text=text)
 
     def link(self, link, children=None, title=None):
         if isinstance(children, str):
-            children = [{'type': 'text', 'text': children}]
-        return {
-            'type': 'link',
-            'link': link,
-            'children': children,
-            'title': title,
-        }
+            children = [self.node('text', text=children)]
+        return self.node('link', link=link, children=children, title=title)
 
     def image(self, src, alt="", title=None):
-        return {'type': 'image', 'src': src, 'alt': alt, 'title': title}
+        return self.node('image', src=src, alt=alt, title=title)
 
     def codespan(self, text):
-        return {'type': 'codespan', 'text': text}
+        return self.node('codespan', text=text)
 
     def linebreak(self):
-        return {'type': 'linebreak'}
+        return self.node('linebreak')
 
     def inline_html(self, html):
-        return {'type': 'inline_html', 'text': html}
+        return self.node('inline_html', text=html)
 
     def heading(self, children, level):
-        return {'type': 'heading', 'children': children, 'level': level}
+        return self.node('heading', children=children, level=level)
 
     def newline(self):
-        return {'type': 'newline'}
+        return self.node('newline')
 
     def thematic_break(self):
-        return {'type': 'thematic_break'}
+        return self.node('thematic_break')
 
     def block_code(self, children, info=None):
-        return {
-            'type': 'block_code',
-            'text': children,
-            'info': info
-        }
+        return self.node('block_code', text=children, info=info)
 
     def block_html(self, children):
-        return {'type': 'block_html', 'text': children}
+        return self.node('block_html', text=children)
 
     def list(self, children, ordered, level, start=None):
-        token = {
-            'type': 'list',
-            'children': children,
-            'ordered': ordered,
-            'level': level,
-        }
         if start is not None:
-            token['start'] = start
-        return token
+            return self.node(
+                'list', children=children, ordered=ordered, level=level,
+                start=start,
+            )
+        return self.node(
+            'list', children=children, ordered=ordered, level=level)
 
     def list_item(self, children, level):
-        return {'type': 'list_item', 'children': children, 'level': level}
+        return self.node('list_item', children=children, level=level)
 
     def _create_default_method(self, name):
         def __ast(children):
-            return {'type': name, 'children': children}
+            return self.node(name, children=children)
         return __ast
 
     def _get_method(self, name):
@@ -100,6 +102,12 @@ class AstRenderer(BaseRenderer):
         return list(data)
 
 
+def _compacting(method):
+    def _method(*args, **kwargs):
+        return compact(method(*args, **kwargs))
+    return _method
+
+
 class HTMLRenderer(BaseRenderer):
     NAME = 'html'
     HARMFUL_PROTOCOLS = {
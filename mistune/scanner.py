@@ -1,11 +1,84 @@
+import functools
 import re
+import time
+from collections import OrderedDict
+
+from .cancel import ParseCancelled
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+_ZERO_WIDTH = {sre_constants.AT, sre_constants.ASSERT, sre_constants.ASSERT_NOT}
+_REPEATS = {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT}
+if hasattr(sre_constants, 'POSSESSIVE_REPEAT'):
+    _REPEATS.add(sre_constants.POSSESSIVE_REPEAT)
+_GROUPS = {sre_constants.SUBPATTERN}
+if hasattr(sre_constants, 'ATOMIC_GROUP'):
+    _GROUPS.add(sre_constants.ATOMIC_GROUP)
+
+#: character classes wider than this don't make useful triggers
+_MAX_CLASS = 256
+
 
 class Scanner(re.Scanner):
+    """Scan a text for the rules of a lexicon, leftmost match first.
+
+    The text between matches goes to ``parse_text``. Every match has to
+    start with one of a few triggers -- the characters (or, for rules
+    like ``' {2,}\\n'``, the strings) its rule can start with -- so the
+    rules are only tried where a trigger occurs, and a text without any
+    is handed to ``parse_text`` whole. A run like ``' {2,}'`` only
+    triggers where it starts: if none of the rules match there, they
+    can't match further into the run either.
+    """
+
+    def __init__(self, lexicon, flags=0):
+        super(Scanner, self).__init__(lexicon, flags)
+        self.triggers, self.runs = _compile_triggers(lexicon, flags)
+
+    def search(self, string, pos=0):
+        """Return the first match at or after ``pos``, or None."""
+        triggers = self.triggers
+        if triggers is None:
+            return self.scanner.search(string, pos)
+        find = triggers.search
+        match = self.scanner.match
+        if string[pos - 1:pos + 1] in self.runs:
+            # inside a run, where the trigger doesn't see ``pos``
+            m = match(string, pos)
+            if m is not None:
+                return m
+            pos += 1
+        trigger = find(string, pos)
+        while trigger is not None:
+            start = trigger.start()
+            m = match(string, start)
+            if m is not None:
+                return m
+            trigger = find(string, start + 1)
+        return None
+
     def iter(self, string, state, parse_text):
-        sc = self.scanner.scanner(string)
+        if self.triggers is None:
+            return self._iter(
+                iter(self.scanner.scanner(string).search, None),
+                string, state, parse_text)
+        trigger = self.triggers.search(string)
+        if trigger is None:
+            # nothing to match, as in the content of most emphasis
+            return iter((parse_text(string, state),) if string else ())
+        return self._iter_triggered(
+            trigger.start(), string, state, parse_text)
 
+    def _iter(self, matches, string, state, parse_text):
+        cancel = state.get('cancel')
         pos = 0
-        for match in iter(sc.search, None):
+        for match in matches:
+            if cancel is not None and cancel.cancelled:
+                raise ParseCancelled()
             name, method = self.lexicon[match.lastindex - 1][1]
             hole = string[pos:match.start()]
             if hole:
@@ -18,19 +91,280 @@ class Scanner(re.Scanner):
         if hole:
             yield parse_text(hole, state)
 
+    def _iter_triggered(self, start, string, state, parse_text):
+        # :meth:`search` unrolled: tried at each trigger from ``start`` on,
+        # with no call per candidate
+        find = self.triggers.search
+        match = self.scanner.match
+        runs = self.runs
+        lexicon = self.lexicon
+        cancel = state.get('cancel')
+        pos = 0
+        while start >= 0:
+            m = match(string, start)
+            if m is None:
+                trigger = find(string, start + 1)
+                start = -1 if trigger is None else trigger.start()
+                continue
+            if cancel is not None and cancel.cancelled:
+                raise ParseCancelled()
+            hole = string[pos:start]
+            if hole:
+                yield parse_text(hole, state)
+            yield lexicon[m.lastindex - 1][1][1](m, state)
+            pos = m.end()
+            if string[pos - 1:pos + 1] in runs:
+                # inside a run, where the trigger doesn't see ``pos``
+                start = pos
+            else:
+                trigger = find(string, pos)
+                start = -1 if trigger is None else trigger.start()
+
+        hole = string[pos:]
+        if hole:
+            yield parse_text(hole, state)
+
+
+def _compile_triggers(lexicon, flags=0):
+    # a regex finding the places a match of the lexicon can start, or
+    # None when (about) any character can start one; and the runs among
+    # them, which it only finds where they start
+    chars = set()
+    strings = set()
+    for pattern, _ in lexicon:
+        parsed = sre_parse.parse(pattern, flags)
+        if parsed.state.flags & sre_constants.SRE_FLAG_IGNORECASE:
+            return None, frozenset()
+        found = _leads(parsed, not _refers_back(parsed))
+        if found is None or found[1]:
+            return None, frozenset()
+        for lead in found[0]:
+            if len(lead) == 1:
+                chars.add(lead)
+            elif not (isinstance(lead, _Run) and lead in strings):
+                # a string that's a run in one rule but not in another
+                # isn't treated as one
+                strings.discard(lead)
+                strings.add(lead)
+
+    alternatives = []
+    # two of a run's character, the way the middle of a run starts
+    runs = set()
+    for lead in sorted(strings):
+        if isinstance(lead, _Run) and lead[0] not in chars:
+            # a match starting inside the run would also have matched
+            # (with a longer run) where the run starts. The lookbehind
+            # comes after the first character, leaving that for the
+            # regex engine to skip ahead to
+            char = re.escape(lead[0])
+            alternatives.append('%s(?<!%s%s)%s' % (
+                char, char, char, re.escape(lead[1:])))
+            runs.add(lead[0] * 2)
+        else:
+            alternatives.append(re.escape(lead))
+    if chars:
+        alternatives.append(
+            '[' + ''.join(re.escape(c) for c in sorted(chars)) + ']')
+    return re.compile('|'.join(alternatives)), frozenset(runs)
+
+
+class _Run(str):
+    # the lead of an unbounded repeat of a single character
+    __slots__ = ()
+
+
+def _leads(items, runs=True):
+    # the strings every match of ``items`` starts with one of, and whether
+    # ``items`` can match the empty string; None for "any character".
+    # Leads of unbounded repeats are runs, unless ``runs`` is false
+    leads = set()
+    for op, av in items:
+        if op in _ZERO_WIDTH:
+            # what an assertion sees changes along a run
+            runs = False
+            continue
+        if op is sre_constants.LITERAL:
+            leads.add(chr(av))
+            return leads, False
+        if op is sre_constants.IN:
+            chars = _charset(av)
+            if chars is None:
+                return None
+            leads |= chars
+            return leads, False
+
+        if op in _GROUPS:
+            if op is sre_constants.SUBPATTERN and (
+                    av[1] & sre_constants.SRE_FLAG_IGNORECASE):
+                return None
+            found = _leads(av[-1] if op is sre_constants.SUBPATTERN else av, runs)
+        elif op is sre_constants.BRANCH:
+            found = (set(), False)
+            for branch in av[1]:
+                sub = _leads(branch, runs)
+                if sub is None:
+                    return None
+                found[0].update(sub[0])
+                found = (found[0], found[1] or sub[1])
+        elif op in _REPEATS:
+            low, high, item = av
+            if low > 1 and len(item) == 1 and item[0][0] is sre_constants.LITERAL:
+                # a run like `` {2,}`` starts with ``low`` of its character
+                lead = chr(item[0][1]) * low
+                if runs and high == sre_constants.MAXREPEAT:
+                    lead = _Run(lead)
+                leads.add(lead)
+                return leads, False
+            found = _leads(item, runs)
+            if found is not None and low == 0:
+                found = (found[0], True)
+        else:
+            return None
+
+        if found is None:
+            return None
+        leads |= found[0]
+        if not found[1]:
+            return leads, False
+    return leads, True
+
+
+def _refers_back(items):
+    # whether a parsed pattern has a backreference, which would see the
+    # part of a run it captured change along the run
+    for op, av in items:
+        if op is sre_constants.GROUPREF or op is sre_constants.GROUPREF_EXISTS:
+            return True
+        if not isinstance(av, (tuple, list)):
+            continue
+        for sub in av:
+            subs = sub if isinstance(sub, list) else [sub]
+            if any(isinstance(p, sre_parse.SubPattern) and _refers_back(p)
+                   for p in subs):
+                return True
+    return False
+
+
+def _charset(items):
+    chars = set()
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            chars.add(chr(av))
+        elif op is sre_constants.RANGE and av[1] - av[0] < _MAX_CLASS:
+            chars.update(map(chr, range(av[0], av[1] + 1)))
+        else:
+            return None
+    if len(chars) > _MAX_CLASS:
+        return None
+    return chars
+
+
+class RuleList(list):
+    """A list of rule names that keeps its scanner cache :attr:`key` up to
+    date, so that looking a scanner up doesn't join the names every time.
+    """
+
+    __slots__ = ('key',)
+
+    def __init__(self, *args):
+        super(RuleList, self).__init__(*args)
+        self.key = '|'.join(self)
+
+
+def _updating_key(name):
+    method = getattr(list, name)
+
+    def wrapper(self, *args):
+        result = method(self, *args)
+        self.key = '|'.join(self)
+        return result
+    wrapper.__name__ = name
+    return wrapper
+
+
+for _name in (
+        'append', 'extend', 'insert', 'remove', 'pop', 'clear', 'sort',
+        'reverse', '__setitem__', '__delitem__', '__iadd__', '__imul__'):
+    setattr(RuleList, _name, _updating_key(_name))
+del _name
+
+
+class ScannerCache(object):
+    """Compiled scanners by rule list, dropping the least recently used
+    past ``maxsize``. Counts hits, misses and the seconds spent compiling.
+    """
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.compile_time = 0.0
+        self._entries = OrderedDict()
+        # the key used last, which is already the most recent
+        self._last = (None, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return '<ScannerCache size={}/{} hits={} misses={} compile={:.3f}s>'.format(
+            len(self), self.maxsize, self.hits, self.misses, self.compile_time)
+
+    def get(self, key):
+        last_key, sc = self._last
+        if key == last_key:
+            # nested renders look the same key up over and over
+            self.hits += 1
+            return sc
+        sc = self._entries.get(key)
+        if sc is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self._last = (key, sc)
+        self.hits += 1
+        return sc
+
+    def put(self, key, sc, compile_time=0.0):
+        self._entries[key] = sc
+        self._entries.move_to_end(key)
+        self._last = (key, sc)
+        self.compile_time += compile_time
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self._last = (None, None)
+        self.hits = self.misses = 0
+        self.compile_time = 0.0
+
 
 class ScannerParser(object):
     scanner_cls = Scanner
     RULE_NAMES = tuple()
+    #: compiled scanners kept per parser
+    SCANNER_CACHE_SIZE = 64
 
     def __init__(self):
-        self.rules = list(self.RULE_NAMES)
+        self.rules = RuleList(self.RULE_NAMES)
         self.rule_methods = {}
-        self._cached_sc = {}
+        self._cached_sc = ScannerCache(self.SCANNER_CACHE_SIZE)
 
     def register_rule(self, name, pattern, method):
         self.rule_methods[name] = (pattern, lambda m, state: method(self, m, state))
 
+    def overlay_rule(self, state, name, pattern, method):
+        """Add a rule for the document ``state`` belongs to only.
+
+        The rule is kept in ``state`` and follows the parser's own
+        :attr:`rules` when those are scanned; the parser itself is left as
+        it is. Scanners are cached by the overlaid patterns, so parsing the
+        same document again reuses the scanner compiled the first time.
+        """
+        overlays = state.setdefault('overlay_rules', {})
+        overlays.setdefault(self, {})[name] = (pattern, method)
+
     def get_rule_pattern(self, name):
         if name not in self.RULE_NAMES:
             return self.rule_methods[name][0]
@@ -45,7 +379,10 @@ class ScannerParser(object):
         raise NotImplementedError
 
     def _scan(self, s, state, rules):
-        sc = self._create_scanner(rules)
+        overlay = None
+        if rules is self.rules and 'overlay_rules' in state:
+            overlay = state['overlay_rules'].get(self)
+        sc = self._create_scanner(rules, overlay)
         for tok in sc.iter(s, state, self.parse_text):
             if isinstance(tok, list):
                 for t in tok:
@@ -53,18 +390,40 @@ class ScannerParser(object):
             elif tok:
                 yield tok
 
-    def _create_scanner(self, rules):
-        sc_key = '|'.join(rules)
+    def rule_lists(self):
+        """Every rule list a parse can scan with, for :meth:`warm_up`."""
+        return [self.rules]
+
+    def warm_up(self):
+        """Compile the scanner of every list in :meth:`rule_lists`."""
+        for rules in self.rule_lists():
+            self._create_scanner(rules)
+
+    def _create_scanner(self, rules, overlay=None):
+        if type(rules) is RuleList:
+            sc_key = rules.key
+        else:
+            sc_key = '|'.join(rules)
+        if overlay:
+            sc_key = (sc_key,) + tuple(
+                (name, pattern) for name, (pattern, _) in overlay.items()
+            )
         sc = self._cached_sc.get(sc_key)
-        if sc:
+        if sc is not None:
             return sc
 
+        start = time.perf_counter()
         lexicon = [
             (self.get_rule_pattern(n), (n, self.get_rule_method(n)))
             for n in rules
         ]
+        if overlay:
+            lexicon.extend(
+                (pattern, (name, functools.partial(method, self)))
+                for name, (pattern, method) in overlay.items()
+            )
         sc = self.scanner_cls(lexicon)
-        self._cached_sc[sc_key] = sc
+        self._cached_sc.put(sc_key, sc, time.perf_counter() - start)
         return sc
 
 
@@ -90,25 +449,37 @@ class Matcher(object):
         return m.start() + 1
 
     def iter(self, string, state, parse_text):
-        pos = 0
+        for _, _, token in self.iter_spans(string, state, parse_text):
+            yield token
+
+    def iter_spans(self, string, state, parse_text, pos=0):
+        """Like :meth:`iter`, but yield ``(start, end, token)`` tuples.
+
+        Scanning starts at ``pos``, which must be a block boundary of
+        ``string``; the spans are offsets into ``string``.
+        """
         endpos = len(string)
-        last_end = 0
+        last_end = pos
+        cancel = state.get('cancel')
         while 1:
             if pos >= endpos:
                 break
+            if cancel is not None and cancel.cancelled:
+                raise ParseCancelled()
             for rule, (name, method) in self.lexicon:
                 match = rule.match(string, pos)
                 if match is not None:
                     start, end = match.span()
                     if start > last_end:
-                        yield parse_text(string[last_end:start], state)
+                        hole = string[last_end:start]
+                        yield last_end, start, parse_text(hole, state)
 
                     if name.endswith('_start'):
                         token = method(match, state, string)
-                        yield token[0]
                         end = token[1]
+                        yield start, end, token[0]
                     else:
-                        yield method(match, state)
+                        yield start, end, method(match, state)
                     last_end = pos = end
                     break
             else:
@@ -118,4 +489,4 @@ class Matcher(object):
                 pos = found
 
         if last_end < endpos:
-            yield parse_text(string[last_end:], state)
+            yield last_end, endpos, parse_text(string[last_end:], state)